@@ -1,59 +1,62 @@
+import csv
+import io
 import json
+import math
 import os
 import sys
+import uuid
 from flask import Flask, request, jsonify, Response
 from twilio.twiml.messaging_response import MessagingResponse
-import datetime  
-import pandas as pd
-import joblib 
-from model.chatbot_model import FinancialChatbot
+from concurrent.futures import ThreadPoolExecutor
+from model.background_loader import BackgroundLoader
+from model.batch_server import BatchedGenerator
+from model.knowledge_index import KnowledgeIndex, build_knowledge_index
+from model.response_cache import ResponseCache
+from session_store import create_session_store
+from ledger import InsufficientFundsError, LedgerError, create_ledger, to_cents
+from journal import create_journal
+from idempotency import create_idempotency_index
+from router import MessageRouter
+from scoring import score_answers, score_records
+from scoring_flow import ScoringFlow
 
 app = Flask(__name__)
 
-MAP_UBICACION = {
-    'Chiapas': 0, 'Puebla': 1, 'Guanajuato': 2, 'Sonora': 3, 'Jalisco': 4,
-    'Veracruz': 5, 'Oaxaca': 6, 'Michoacan': 7, 'Sinaloa': 8, 'Hidalgo': 9,
-    'Ciudad de México': 10, 'Nuevo León' : 11, 'Guerrero': 12, 'Tamaulipas':13,
-    'Zacatecas': 14, 'San Luis Potosí': 15, 'Nayarit': 16, 'Otros': 17
-}
-MAP_TIPO_NEGOCIO = {
-    'Ganaderia - Aves': 0, 'Otras actividades pecuarias': 1, 'Hortalizas': 2,
-    'Granos': 3, 'Ganaderia - Bovinos': 4, 'Frutales': 5, 'Ganaderia - Porcinos': 6,
-    'Cultivos industriales/perennes': 7, 'Agricultura mixta': 8, 'Servicios y transformacion': 9
-}
-MAP_TAMANO_OPERACION = {'Pequeño': 0, 'Mediano': 1, 'Grande': 2}
-MAP_FRECUENCIA_INGRESOS = {'Constante': 0, 'Estacional': 1}
-MAP_ESCOLARIDAD = {
-    'Primaria': 0, 'Secundaria': 1, 'Preparatoria': 2,
-    'Universidad': 3, 'Sin estudios': 4
-}
-MAP_SCORE_NAMES = {0: 'Bueno', 1: 'Regular', 2: 'Malo'}
-SCORING_FEATURES_ORDER = [
-    'Edad', 'Ubicacion_Estado', 'Dependientes_Economicos', 'Tipo_Negocio',
-    'Tamano_Hectareas', 'Tamano_Operacion', 'Frecuencia_Ingresos',
-    'Ingresos_Anuales_Estimados', 'Escolaridad', 'Anos_Experiencia',
-    'Score_Buro_Credito'
-]
-SCORING_QUESTIONS = [
-    {'key': 'Edad', 'question': '1/11: ¿Cuál es tu edad?', 'type': 'numeric'},
-    {'key': 'Ubicacion_Estado', 'question': '2/11: ¿En qué estado vives?',
-     'type': 'categorical', 'options': MAP_UBICACION},
-    {'key': 'Dependientes_Economicos', 'question': '3/11: ¿Cuántas personas dependen económicamente de ti?', 'type': 'numeric'},
-    {'key': 'Tipo_Negocio', 'question': '4/11: ¿Cuál es tu principal actividad?',
-     'type': 'categorical', 'options': MAP_TIPO_NEGOCIO},
-    {'key': 'Tamano_Hectareas', 'question': '5/11: ¿Cuántas hectáreas trabajas?', 'type': 'numeric'},
-    {'key': 'Tamano_Operacion', 'question': '6/11: ¿Consideras tu operación Pequeña, Mediana o Grande?',
-     'type': 'categorical', 'options': MAP_TAMANO_OPERACION},
-    {'key': 'Frecuencia_Ingresos', 'question': '7/11: ¿Tus ingresos son todo el año (Constante) o solo por temporadas (Estacional)?',
-     'type': 'categorical', 'options': MAP_FRECUENCIA_INGRESOS},
-    {'key': 'Ingresos_Anuales_Estimados', 'question': '8/11: ¿Cuál es tu ingreso anual estimado? (Escribe solo el número, ej. 50000)', 'type': 'numeric'},
-    {'key': 'Escolaridad', 'question': '9/11: ¿Cuál es tu último nivel de estudios?',
-     'type': 'categorical', 'options': MAP_ESCOLARIDAD},
-    {'key': 'Anos_Experiencia', 'question': '10/11: ¿Cuántos años de experiencia tienes en el campo?', 'type': 'numeric'},
-    {'key': 'Score_Buro_Credito',
-     'question': "11/11: ¿Sabes tu Score de Buró de Crédito actual? (Escribe el número, o 'No' si no lo sabes)",
-     'type': 'buro_special'}
-]
+# Con ASYNC_REPLIES=1 el webhook contesta a Twilio de inmediato y la respuesta del modelo
+# se envia despues por la API REST, asi la generacion nunca retiene el hilo de la peticion.
+ASYNC_REPLIES = os.environ.get("ASYNC_REPLIES") == "1"
+reply_pool = ThreadPoolExecutor(max_workers=int(os.environ.get("REPLY_WORKERS", "8")), thread_name_prefix="async-reply")
+
+# MessageSid ya procesados con su respuesta. Con SESSION_BACKEND=sqlite se comparten entre
+# workers, asi un reintento que cae en otro proceso no repite el flujo. Twilio abandona la peticion a los 15 s.
+processed_messages = create_idempotency_index(max_entries=20000, ttl_seconds=24 * 3600)
+IDEMPOTENCY_WAIT_SECONDS = 12
+
+# Un solo enrutador de intenciones para /webhook y /chat
+router = MessageRouter()
+
+# Preguntas del perfil crediticio compiladas una sola vez
+scoring_flow = ScoringFlow()
+
+# Umbrales de la busqueda en los manuales: con cobertura alta el parrafo ya contiene la respuesta
+# y se devuelve tal cual; con alguna coincidencia se genera una respuesta corta apoyada en el.
+KNOWLEDGE_DIRECT_COVERAGE = 0.75
+# Con un solo termino la cobertura siempre es 1.0 ("gracias" devolvia un parrafo que empieza con
+# "Gracias a..."); tambien se exige un score relativo al de la consulta y un parrafo que no sea un titulo.
+KNOWLEDGE_DIRECT_MIN_TERMS = 2
+KNOWLEDGE_DIRECT_MIN_RELATIVE_SCORE = 1.0
+KNOWLEDGE_DIRECT_MIN_WORDS = 20
+KNOWLEDGE_MIN_SCORE = 3.0
+# Lo mismo para generar apoyado en los parrafos: "gracias" (un termino, score 6.19) no debe anclar
+# la respuesta a un parrafo que no tiene que ver; sin estas senales se usa el prompt conversacional
+KNOWLEDGE_GROUNDED_MIN_TERMS = 2
+KNOWLEDGE_GROUNDED_MIN_RELATIVE_SCORE = 0.5
+GROUNDED_MAX_LENGTH = 120
+
+MAX_BATCH_RECORDS = 100000
+SCORING_LOAD_WAIT_SECONDS = 30
+
+EDUCATIONAL_CONTEXT = "Eres un especialista en educación financiera para agricultores..."
 
 class AdvancedFinancialAssistant:
 
@@ -61,39 +64,90 @@ class AdvancedFinancialAssistant:
 
         self.model_path = "./fine-tuned-financial-chatbot" 
         self.prototype_path = "./prototype-chatbot"
-        try:
-            if os.path.exists(self.model_path):
-                print(f"Cargando modelo de IA desde: {self.model_path}")
-                self.chatbot = FinancialChatbot(self.model_path)
-            elif os.path.exists(self.prototype_path):
-                print(f"Modelo  no encontrado. Usando PROTOTIPO desde: {self.prototype_path}")
-                self.chatbot = FinancialChatbot(self.prototype_path)
-            else:
-                print("Ni CALIDAD ni PROTOTIPO encontrados. Usando modelo BASE.")
-                self.chatbot = FinancialChatbot()
-        except Exception as e:
-            print(f"❌ Error cargando modelo de IA: {e}")
-            self.chatbot = None
+        # Adaptador LoRA (train_model.py --lora); CHATBOT_ADAPTER permite elegir entre varios adaptadores
+        self.adapter_path = os.environ.get("CHATBOT_ADAPTER", "./lora-financial-chatbot")
+        # fp32 (por defecto), int8 (cuantizado dinamico) u onnx; ver model/backend_report.py
+        self.chatbot_backend = os.environ.get("CHATBOT_BACKEND", "fp32")
+        # Con varios workers, CHATBOT_SHARED_WEIGHTS=1 mapea un solo archivo de pesos en todos (solo fp32)
+        self.chatbot_shared_weights = os.environ.get("CHATBOT_SHARED_WEIGHTS") == "1"
+        self.scoring_model_path = "credit_scoring_model.pkl"
+        self.knowledge_index_path = "data/knowledge_index.json"
+        self.generator = None
 
+        self.response_cache = ResponseCache(max_entries=1000, ttl_seconds=6 * 3600, similarity_threshold=0.8)
 
-        self.scoring_model_path = "credit_scoring_model.pkl"
+        # Los modelos se cargan en segundo plano: Flask responde de inmediato y, mientras tanto,
+        # los flujos de transferencia funcionan y las preguntas usan los manuales o el fallback.
+        self.knowledge_loader = BackgroundLoader("índice de conocimiento", self._load_knowledge_index).start()
+        self.scoring_loader = BackgroundLoader("modelo de SCORING", self._load_scoring_model).start()
+        self.chatbot_loader = BackgroundLoader("modelo de IA", self._load_chatbot).start()
+
+        # Saldos persistentes y seguros entre hilos y workers (ver ledger.py)
+        self.ledger = create_ledger()
+        # Bitacora de auditoria en JSON Lines (ver journal.py; JOURNAL_DURABILITY=fsync|group|async)
+        self.journal = create_journal()
+        
+        self.user_sessions = create_session_store()
+
+    @property
+    def chatbot(self):
+        return self.chatbot_loader.value
+
+    @property
+    def scoring_model(self):
+        return self.scoring_loader.value
+
+    @property
+    def knowledge_index(self):
+        return self.knowledge_loader.value
+
+    def models_ready(self):
+        return all(loader.ready for loader in (self.knowledge_loader, self.scoring_loader, self.chatbot_loader))
+
+    def _load_chatbot(self):
+        from model.chatbot_model import FinancialChatbot, adapter_base_model
+
+        # Un adaptador explicito tiene prioridad; el de la ruta por defecto solo si no hay modelo completo
+        use_adapter = "CHATBOT_ADAPTER" in os.environ or (
+            not os.path.exists(self.model_path) and os.path.exists(self.adapter_path)
+        )
+        options = dict(backend=self.chatbot_backend, shared_weights=self.chatbot_shared_weights)
+        if use_adapter:
+            print(f"Cargando adaptador LoRA desde: {self.adapter_path}")
+            chatbot = FinancialChatbot(adapter_base_model(self.adapter_path), adapter_path=self.adapter_path, **options)
+        elif os.path.exists(self.model_path):
+            print(f"Cargando modelo de IA desde: {self.model_path}")
+            chatbot = FinancialChatbot(self.model_path, **options)
+        elif os.path.exists(self.prototype_path):
+            print(f"Modelo  no encontrado. Usando PROTOTIPO desde: {self.prototype_path}")
+            chatbot = FinancialChatbot(self.prototype_path, **options)
+        else:
+            print("Ni CALIDAD ni PROTOTIPO encontrados. Usando modelo BASE.")
+            chatbot = FinancialChatbot(**options)
+
+        chatbot.warm_prefix(f"{EDUCATIONAL_CONTEXT}\n\nHistorial:\n")
+
+        # Las peticiones concurrentes se agrupan en lotes para un solo generate
+        self.generator = BatchedGenerator(chatbot, max_batch_size=8, max_wait_ms=25)
+        return chatbot
+
+    def _load_scoring_model(self):
+        import joblib
         try:
-            self.scoring_model = joblib.load(self.scoring_model_path)
+            scoring_model = joblib.load(self.scoring_model_path)
             print(f"🎯 Cargando modelo de SCORING desde: {self.scoring_model_path}")
+            return scoring_model
         except FileNotFoundError:
             print(f"❌ ERROR: Modelo de SCORING '{self.scoring_model_path}' no encontrado.")
-            self.scoring_model = None
-        except Exception as e:
-            print(f"❌ Error cargando modelo de SCORING: {e}")
-            self.scoring_model = None
-
+            return None
 
-        self.ACCOUNTS = {
-            "ACC001": {"holder": "Sergio Rock", "balance": 1000.00},
-            "ACC002": {"holder": "Emilio Pinelo", "balance": 500.00}
-        }
-        
-        self.user_sessions = {}
+    def _load_knowledge_index(self):
+        if os.path.exists(self.knowledge_index_path):
+            knowledge_index = KnowledgeIndex.load(self.knowledge_index_path)
+            print(f"📚 Índice de conocimiento cargado: {len(knowledge_index)} párrafos")
+            return knowledge_index
+        # Sin pool de procesos: con "python app.py" cada proceso spawn volveria a importar app.py
+        return build_knowledge_index(index_path=self.knowledge_index_path, workers=1)
 
     def get_greeting(self):
 
@@ -105,105 +159,148 @@ class AdvancedFinancialAssistant:
         ]
         return message + "\n\n" + "\n".join(options)
 
-    def handle_educational_request(self, user_message, user_id):
-        if not self.chatbot: return self._get_fallback_response(user_message)
-        if user_id not in self.user_sessions or self.user_sessions[user_id].get('mode') != 'educational':
-            self.user_sessions[user_id] = {"mode": "educational", "history": []}
-        self.user_sessions[user_id]["history"].append(f"Usuario: {user_message}")
-        prompt_message = user_message
-        
+    def _educational_query(self, user_message):
         if user_message.strip() == '1': 
-            prompt_message = "Háblame de educación financiera"
-            
-        prompt = self._build_educational_prompt(prompt_message, user_id)
-        response = self.chatbot.generate_response(prompt, max_length=400)
-        self.user_sessions[user_id]["history"].append(f"Asistente: {response}")
+            return "Háblame de educación financiera"
+        return user_message
+
+    def _start_educational_turn(self, user_message, user_id):
+        session = self.user_sessions.get(user_id)
+        if not session or session.get('mode') != 'educational':
+            session = {"mode": "educational", "history": []}
+        session["history"].append(f"Usuario: {user_message}")
+        self.user_sessions[user_id] = session
+
+    def _append_history(self, user_id, line):
+        session = self.user_sessions.get(user_id)
+        if session and session.get('mode') == 'educational':
+            session["history"].append(line)
+            self.user_sessions[user_id] = session
+
+    def _plan_educational_reply(self, user_message, user_id):
+        prompt_message = self._educational_query(user_message)
+
+        # Preguntas repetidas se contestan desde la cache sin tocar el modelo
+        cached = self.response_cache.get(prompt_message)
+        if cached is not None:
+            self._start_educational_turn(user_message, user_id)
+            return cached, None, None, False
+
+        # Primero buscamos en los manuales: si un parrafo ya responde, no hace falta generar
+        matches = self.knowledge_index.search(prompt_message, top_k=2) if self.knowledge_index else []
+        best = matches[0] if matches else None
+        direct_answer = (best is not None and best['coverage'] >= KNOWLEDGE_DIRECT_COVERAGE
+                         and best['score'] >= KNOWLEDGE_MIN_SCORE
+                         and best['matched_terms'] >= KNOWLEDGE_DIRECT_MIN_TERMS
+                         and best['relative_score'] >= KNOWLEDGE_DIRECT_MIN_RELATIVE_SCORE
+                         and best['length'] >= KNOWLEDGE_DIRECT_MIN_WORDS)
+        grounded = (best is not None and best['score'] >= KNOWLEDGE_MIN_SCORE
+                    and best['matched_terms'] >= KNOWLEDGE_GROUNDED_MIN_TERMS
+                    and best['relative_score'] >= KNOWLEDGE_GROUNDED_MIN_RELATIVE_SCORE)
+
+        if not self.chatbot and not direct_answer:
+            return None
+        self._start_educational_turn(user_message, user_id)
+
+        # Solo se cachean las respuestas que no dependen del historial: un "dime más" generado con la
+        # conversacion de un usuario no le sirve a otro
+        if direct_answer:
+            self.response_cache.put(prompt_message, best['paragraph'])
+            return best['paragraph'], None, None, False
+        elif grounded:
+            prompt = self._build_grounded_prompt(prompt_message, [m['paragraph'] for m in matches])
+            return None, prompt, GROUNDED_MAX_LENGTH, True
+        else:
+            prompt = self._build_educational_prompt(prompt_message, user_id)
+            return None, prompt, 400, False
+
+    def handle_educational_request(self, user_message, user_id):
+        plan = self._plan_educational_reply(user_message, user_id)
+        if plan is None: return self._get_fallback_response(user_message)
+        response, prompt, max_length, cacheable = plan
+        if prompt is not None:
+            response = self.generator.generate(prompt, max_length=max_length)
+            if cacheable:
+                self._cache_generated_response(user_message, response)
+        self._append_history(user_id, f"Asistente: {response}")
         return response
 
+    def stream_educational_request(self, user_message, user_id):
+        plan = self._plan_educational_reply(user_message, user_id)
+        if plan is None:
+            yield self._get_fallback_response(user_message)
+            return
+        response, prompt, max_length, cacheable = plan
+        if prompt is None:
+            self._append_history(user_id, f"Asistente: {response}")
+            yield response
+            return
+
+        chunks = []
+        for chunk in self.chatbot.stream_response(prompt, max_length=max_length):
+            chunks.append(chunk)
+            yield chunk
+        response = ''.join(chunks).strip()
+        if cacheable:
+            self._cache_generated_response(user_message, response)
+        self._append_history(user_id, f"Asistente: {response}")
+
+    def _cache_generated_response(self, user_message, response):
+        # Solo se llega aqui con el modelo cargado, asi que importar chatbot_model (torch) ya no cuesta
+        from model.chatbot_model import ERROR_RESPONSE
+        # Un stream que falla a medias termina con ERROR_RESPONSE despues de los fragmentos ya enviados
+        if ERROR_RESPONSE not in response:
+            self.response_cache.put(self._educational_query(user_message), response)
+
     def _build_educational_prompt(self, user_message, user_id):
-        session = self.user_sessions[user_id]
+        session = self.user_sessions.get(user_id, {"history": []})
         history = "\n".join(session["history"][-4:])
-        base_context = "Eres un especialista en educación financiera para agricultores..."
-        prompt = f"{base_context}\n\nHistorial:\n{history}\n\nUsuario: {user_message}\nAsistente:"
+        prompt = f"{EDUCATIONAL_CONTEXT}\n\nHistorial:\n{history}\n\nUsuario: {user_message}\nAsistente:"
+        return prompt
+
+    def _build_grounded_prompt(self, user_message, paragraphs):
+        context = "\n".join(paragraphs)
+        prompt = f"Responde usando solo esta información:\n{context}\n\nUsuario: {user_message}\nAsistente:"
         return prompt
 
     def _get_fallback_response(self, user_message):
         return "Como asistente financiero agrílogo, puedo ayudarte con..."
 
-    def _format_question(self, question_data):
-        question_text = question_data['question']
-        if question_data['type'] == 'categorical':
-            options_list = [f"{i + 1}. {name}" for i, name in enumerate(question_data['options'].keys())]
-            question_text += "\n\n" + "\n".join(options_list)
-            question_text += "\n\nResponde solo con el número de la opción."
-        return question_text
-
     def start_scoring_flow(self, user_id):
-        if not self.scoring_model:
+        # Si el modelo aun se esta cargando el flujo puede empezar; estara listo antes de la ultima respuesta
+        if self.scoring_loader.ready and not self.scoring_model:
             return "Lo siento, el servicio de cálculo de crédito no está disponible."
         self.user_sessions[user_id] = {'mode': 'scoring', 'step': 0, 'answers': {}}
-        return self._format_question(SCORING_QUESTIONS[0])
+        return scoring_flow.first_prompt
 
     def handle_scoring_flow(self, user_answer, user_id):
         session = self.user_sessions.get(user_id)
         if not session or session.get('mode') != 'scoring': return self.get_greeting()
         
-        if user_answer.lower() in ['cancelar', 'salir', 'menu', 'exit']:
+        if scoring_flow.is_cancel(user_answer):
             self.user_sessions[user_id] = {"mode": "educational", "history": []}
             return "Cálculo de perfil cancelado. Volviendo al menú principal."
         
-        current_step = session['step']
-        question_data = SCORING_QUESTIONS[current_step]
-        key_to_save = question_data['key']
-        
-        try:
-            if question_data['type'] == 'numeric':
-                float(user_answer)
-                session['answers'][key_to_save] = user_answer
-            elif question_data['type'] == 'categorical':
-                choice_index = int(user_answer) - 1
-                options_list = list(question_data['options'].keys())
-                if 0 <= choice_index < len(options_list):
-                    session['answers'][key_to_save] = options_list[choice_index]
-                else:
-                    return "Opción no válida.\n\n" + self._format_question(question_data)
-            elif question_data['type'] == 'buro_special':
-                if user_answer.lower() == 'no':
-                    session['answers'][key_to_save] = -1
-                else:
-                    float(user_answer)
-                    session['answers'][key_to_save] = user_answer
-        except ValueError:
-            return "Respuesta inválida.\n\n" + self._format_question(question_data)
+        # Un mensaje puede traer varias respuestas; se guardan las validas aunque alguna falle
+        session['step'], error = scoring_flow.answer(session['step'], session['answers'], user_answer)
+        if error:
+            self.user_sessions[user_id] = session
+            return error
         
-        # Siguiente paso
-        session['step'] += 1
-        if session['step'] >= len(SCORING_QUESTIONS):
+        if scoring_flow.is_complete(session['step']):
             print(f"Respuestas completas de {user_id}: {session['answers']}")
             response_text = self.get_credit_score(session['answers'])
             self.user_sessions[user_id] = {"mode": "educational", "history": []}
         else:
-            response_text = self._format_question(SCORING_QUESTIONS[session['step']])
+            self.user_sessions[user_id] = session
+            response_text = scoring_flow.prompt(session['step'])
         return response_text
 
     def get_credit_score(self, answers_dict):
+        self.scoring_loader.wait(SCORING_LOAD_WAIT_SECONDS)
         if not self.scoring_model: return "Error: El modelo de scoring no está cargado."
         try:
-            df = pd.DataFrame([answers_dict])
-            num_cols = ['Edad', 'Dependientes_Economicos', 'Tamano_Hectareas', 'Ingresos_Anuales_Estimados', 'Anos_Experiencia', 'Score_Buro_Credito']
-            for col in num_cols:
-                df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
-            df['Ubicacion_Estado'] = df['Ubicacion_Estado'].map(MAP_UBICACION).fillna(-1)
-            df['Tipo_Negocio'] = df['Tipo_Negocio'].map(MAP_TIPO_NEGOCIO).fillna(-1)
-            df['Tamano_Operacion'] = df['Tamano_Operacion'].map(MAP_TAMANO_OPERACION).fillna(-1)
-            df['Frecuencia_Ingresos'] = df['Frecuencia_Ingresos'].map(MAP_FRECUENCIA_INGRESOS).fillna(-1)
-            df['Escolaridad'] = df['Escolaridad'].map(MAP_ESCOLARIDAD).fillna(-1)
-            df = df[SCORING_FEATURES_ORDER]
-            
-            prediction_proba = self.scoring_model.predict_proba(df)
-            prediction = prediction_proba.argmax(axis=1)[0]
-            confidence = prediction_proba.max() * 100
-            score_name = MAP_SCORE_NAMES.get(prediction, "Indeterminado")
+            score_name, confidence = score_answers(self.scoring_model, answers_dict)
             
             return (f"¡Gracias! 📈\nTu clasificación crediticia es: **{score_name.upper()}**.\n"
                     f"(Confianza: {confidence:.2f}%)\n\nRecuerda, es una estimación.")
@@ -212,23 +309,32 @@ class AdvancedFinancialAssistant:
             return "Lo siento, tuve un problema al calcular tu perfil."
 
 
-    def _log_transaction(self, user_id, clabe, amount):
-        timestamp = datetime.datetime.now().isoformat()
-        log_entry = f"[{timestamp}] User: {user_id}, Destino: {clabe}, Monto: {amount}\n"
+    def _log_transaction(self, user_id, transfer):
+        record = {
+            "event": "transfer",
+            "user_id": user_id,
+            "transfer_id": transfer['transfer_id'],
+            "from_account": transfer['from_account'],
+            "to_account": transfer['to_account'],
+            "amount": transfer['amount']
+        }
         try:
-            with open("transactions.log", "a", encoding="utf-8") as f:
-                f.write(log_entry)
-            print(f"✅ Transacción registrada: {log_entry.strip()}")
+            if self.journal.append(record):
+                print(f"✅ Transacción registrada: {transfer['transfer_id']}")
+            else:
+                print(f"❌ ERROR: la bitácora no confirmó la transacción {transfer['transfer_id']}")
         except Exception as e:
             print(f"❌ ERROR al registrar transacción: {e}")
 
-    def process_transfer(self, from_acc, to_acc, amount):
-        self.ACCOUNTS[from_acc]["balance"] -= amount
-        self.ACCOUNTS[to_acc]["balance"] += amount
+    def process_transfer(self, from_acc, to_acc, amount, user_id=None, reference=None):
+        # El saldo pudo cambiar desde que se capturo el monto; el ledger lo vuelve a validar de forma atomica
+        transfer = self.ledger.transfer(from_acc, to_acc, amount, reference=reference, user_id=user_id)
+        if not transfer['duplicate']:
+            self._log_transaction(user_id, transfer)
         result = "✅ Transferencia Exitosa\n\n"
-        result += f"Se transfirieron ${amount:.2f} de {self.ACCOUNTS[from_acc]['holder']} a {self.ACCOUNTS[to_acc]['holder']}\n\n"
+        result += f"Se transfirieron ${amount:.2f} de {self.ledger.get_account(from_acc)['holder']} a {self.ledger.get_account(to_acc)['holder']}\n\n"
         result += "Saldos Actualizados:\n"
-        result += f"• {from_acc}: ${self.ACCOUNTS[from_acc]['balance']:.2f}\n"
+        result += f"• {from_acc}: ${transfer['balances'][from_acc]:.2f}\n"
         return result
 
     def start_transfer_flow(self, user_id):
@@ -249,49 +355,57 @@ class AdvancedFinancialAssistant:
             return "Transferencia cancelada. Volviendo al menú principal."
 
         state = session.get('transfer_step', 'START')
-        data = session.get('transfer_data', {})
+        data = session.setdefault('transfer_data', {})
 
         if state == 'WAITING_FOR_SOURCE':
             account_number = user_answer.upper()
-            if account_number not in self.ACCOUNTS:
+            if account_number not in self.ledger:
                 return f"Cuenta {account_number} no encontrada. Por favor, usa 'ACC001' o 'ACC002'."
             else:
                 data['from_account'] = account_number
                 session['transfer_step'] = 'WAITING_FOR_DESTINATION'
+                self.user_sessions[user_id] = session
                 return "Perfecto. ¿A qué número de cuenta deseas transferir?"
 
         elif state == 'WAITING_FOR_DESTINATION':
             account_number = user_answer.upper()
             from_account = data.get('from_account')
-            if account_number not in self.ACCOUNTS:
+            if account_number not in self.ledger:
                 return f"Cuenta {account_number} no encontrada. Por favor, usa 'ACC001' o 'ACC002'."
             elif account_number == from_account:
                 return "No puedes transferir a la misma cuenta. Por favor, ingresa un número de cuenta diferente:"
             else:
                 data['to_account'] = account_number
                 session['transfer_step'] = 'WAITING_FOR_AMOUNT'
-                from_balance = self.ACCOUNTS[from_account]['balance']
+                self.user_sessions[user_id] = session
+                from_balance = self.ledger.get_account(from_account)['balance']
                 return f"¿Qué monto deseas transferir?\n(Saldo disponible: ${from_balance:.2f})"
 
         elif state == 'WAITING_FOR_AMOUNT':
             try:
                 amount = float(user_answer.replace("$", "").strip())
+                if not math.isfinite(amount):
+                    raise ValueError(user_answer)
                 from_account = data.get('from_account')
+                available = self.ledger.get_account(from_account)['balance']
                 
-                if amount <= 0:
+                # 0.001 pasa "amount <= 0" pero son cero centavos en el ledger
+                if to_cents(amount) <= 0:
                     return "El monto debe ser mayor a cero. Por favor, ingresa un monto válido:"
-                elif amount > self.ACCOUNTS[from_account]['balance']:
-                    available = self.ACCOUNTS[from_account]['balance']
+                elif amount > available:
                     return f"Fondos insuficientes. Saldo disponible: ${available:.2f}\nPor favor, ingresa un monto válido:"
                 else:
                     data['amount'] = amount
+                    # Referencia unica de esta confirmacion: un "SÍ" repetido no aplica la transferencia dos veces
+                    data['reference'] = uuid.uuid4().hex
                     session['transfer_step'] = 'WAITING_FOR_CONFIRMATION'
+                    self.user_sessions[user_id] = session
                     
                     from_acc = data['from_account']
                     to_acc = data['to_account']
                     summary = "\nResumen de la Transferencia\n"
-                    summary += f"Desde: {self.ACCOUNTS[from_acc]['holder']} ({from_acc})\n"
-                    summary += f"Para: {self.ACCOUNTS[to_acc]['holder']} ({to_acc})\n"
+                    summary += f"Desde: {self.ledger.get_account(from_acc)['holder']} ({from_acc})\n"
+                    summary += f"Para: {self.ledger.get_account(to_acc)['holder']} ({to_acc})\n"
                     summary += f"Monto: ${amount:.2f}\n"
                     summary += "━━━━━━━━━━━━━━━━━━━━━\n\n"
                     summary += "Por favor, confirma esta transferencia.\nResponde SÍ para confirmar o NO para cancelar."
@@ -307,8 +421,16 @@ class AdvancedFinancialAssistant:
                 to_acc = data['to_account']
                 amount = data['amount']
                 
-                result = self.process_transfer(from_acc, to_acc, amount)
-                self._log_transaction(user_id, to_acc, amount)
+                try:
+                    result = self.process_transfer(from_acc, to_acc, amount, user_id=user_id,
+                                                   reference=data.get('reference'))
+                except InsufficientFundsError as e:
+                    self.user_sessions[user_id] = {"mode": "educational", "history": []}
+                    return f"Fondos insuficientes. Saldo disponible: ${e.available:.2f}\nTransferencia cancelada."
+                except (LedgerError, ValueError) as e:
+                    print(f"❌ Transferencia rechazada por el ledger para {user_id}: {e}")
+                    self.user_sessions[user_id] = {"mode": "educational", "history": []}
+                    return "No se pudo completar la transferencia. Transferencia cancelada.\n\nResponde 'menu' para volver al menú."
                 
                 result += "\n\nResponde 'menu' para volver al menú."
                 self.user_sessions[user_id] = {"mode": "educational", "history": []}
@@ -329,53 +451,127 @@ assistant = AdvancedFinancialAssistant()
 
 @app.route('/')
 def home():
+    def loaded(loader, missing):
+        return "Sí" if loader.value is not None else ("Cargando..." if not loader.ready else missing)
+
     return jsonify({
         "status": "Chatbot Financiero Agrícola activo",
         "version": "1.0",
-        "modelo_IA_cargado": "Sí" if assistant.chatbot else "No (Modo Fallback)",
-        "modelo_Scoring_cargado": "Sí" if assistant.scoring_model else "No"
+        "modelos_listos": assistant.models_ready(),
+        "modelo_IA_cargado": loaded(assistant.chatbot_loader, "No (Modo Fallback)"),
+        "modelo_Scoring_cargado": loaded(assistant.scoring_loader, "No"),
+        "carga_modelos": {
+            "modelo_IA": assistant.chatbot_loader.status(),
+            "modelo_Scoring": assistant.scoring_loader.status(),
+            "indice_conocimiento": assistant.knowledge_loader.status()
+        },
+        "cache_respuestas": assistant.response_cache.get_stats(),
+        "mensajes_procesados": processed_messages.get_stats()
     })
 
+@app.route('/score/batch', methods=['POST'])
+def score_batch():
+    """Califica muchos solicitantes en una sola llamada: JSON {"records": [...]} o un CSV con encabezados"""
+    if not assistant.scoring_model:
+        if not assistant.scoring_loader.ready:
+            return jsonify({"error": "El modelo de scoring se está cargando."}), 503, {"Retry-After": "5"}
+        return jsonify({"error": "El modelo de scoring no está cargado."}), 503
+    try:
+        if request.mimetype == 'text/csv':
+            records = list(csv.DictReader(io.StringIO(request.get_data(as_text=True))))
+        else:
+            data = request.get_json()
+            records = data.get('records', []) if isinstance(data, dict) else data
+        if not isinstance(records, list) or len(records) > MAX_BATCH_RECORDS:
+            return jsonify({"error": f"Se esperaba una lista de hasta {MAX_BATCH_RECORDS} registros."}), 400
+
+        results = score_records(assistant.scoring_model, records)
+        return jsonify({"total": len(results), "results": results})
+
+    except Exception as e:
+        print(f"❌ Error en /score/batch: {e}")
+        return jsonify({"error": str(e)}), 500
+
 @app.route("/webhook", methods=['POST'])
 def webhook():
     incoming_msg = request.values.get('Body', '').strip()
     user_id = request.values.get('From', 'default_twilio_user')
+    message_sid = request.values.get('MessageSid')
     print(f"📨 Mensaje de WhatsApp de {user_id}: {incoming_msg}")
 
-    response_text = ""
-    session = assistant.user_sessions.get(user_id, {})
-
-
-    if session.get('mode') == 'scoring':
-        response_text = assistant.handle_scoring_flow(incoming_msg, user_id)
-    elif session.get('mode') == 'transfer':
-        response_text = assistant.handle_transfer_flow(incoming_msg, user_id)
-    
+    if message_sid:
+        # Twilio reintenta el POST si tardamos: el reintento recibe la misma respuesta sin repetir el flujo
+        try:
+            response_text, repeated = processed_messages.run(
+                message_sid, lambda: _handle_whatsapp_message(incoming_msg, user_id),
+                wait_timeout=IDEMPOTENCY_WAIT_SECONDS
+            )
+        except TimeoutError:
+            print(f"⏳ Reintento de {message_sid} mientras el original sigue en proceso")
+            return Response("", status=503, headers={"Retry-After": "5"})
+        if repeated:
+            print(f"🔁 Reintento de Twilio {message_sid}: se devuelve la respuesta guardada")
     else:
-        incoming_msg_lower = incoming_msg.lower()
-        
-        edu_keywords = ['1', 'educación', 'aprender', 'háblame', 'habrame', 'enseñame', 'dime', 'info']
-        
-        if not incoming_msg_lower or incoming_msg_lower in ['hola', 'hi', 'inicio', 'start', 'menu']:
-            response_text = assistant.get_greeting()
-        
-        elif any(keyword in incoming_msg_lower for keyword in edu_keywords):
-            response_text = assistant.handle_educational_request(incoming_msg, user_id)
-        
-        elif any(keyword in incoming_msg_lower for keyword in ['2', 'transferencia', 'pago']):
-            response_text = assistant.start_transfer_flow(user_id) 
-        elif any(keyword in incoming_msg_lower for keyword in ['3', 'crédito', 'calcular', 'perfil']):
-            response_text = assistant.start_scoring_flow(user_id)
-        else:
-
-            response_text = assistant.handle_educational_request(incoming_msg, user_id)
+        response_text = _handle_whatsapp_message(incoming_msg, user_id)
 
     resp = MessagingResponse()
-    resp.message(response_text)
+    if response_text is not None:
+        resp.message(response_text)
     xml_response = str(resp)
     return Response(xml_response, mimetype='application/xml')
 
 
+def _handle_whatsapp_message(incoming_msg, user_id):
+    intent = _route_message(incoming_msg, user_id)
+    if intent == "educational":
+        return _educational_reply(incoming_msg, user_id)
+    return _handle_routed(intent, incoming_msg, user_id)
+
+
+def _route_message(message, user_id):
+    session = assistant.user_sessions.get(user_id, {})
+    return router.route(message, session.get('mode'))
+
+
+def _handle_routed(intent, message, user_id):
+    # Intenciones no educativas; la respuesta educativa la entrega cada endpoint a su manera
+    if intent == "scoring_flow":
+        return assistant.handle_scoring_flow(message, user_id)
+    if intent == "transfer_flow":
+        return assistant.handle_transfer_flow(message, user_id)
+    if intent == "transfer":
+        return assistant.start_transfer_flow(user_id)
+    if intent == "scoring":
+        return assistant.start_scoring_flow(user_id)
+    return assistant.get_greeting()
+
+
+def _educational_reply(incoming_msg, user_id):
+    if not ASYNC_REPLIES:
+        return assistant.handle_educational_request(incoming_msg, user_id)
+    reply_pool.submit(_send_async_reply, incoming_msg, user_id, request.values.get('To'))
+    return None
+
+
+def _send_async_reply(incoming_msg, user_id, twilio_number):
+    try:
+        response_text = assistant.handle_educational_request(incoming_msg, user_id)
+        twilio_client().messages.create(from_=twilio_number, to=user_id, body=response_text)
+        print(f"📤 Respuesta asíncrona enviada a {user_id}")
+    except Exception as e:
+        print(f"❌ Error enviando respuesta asíncrona a {user_id}: {e}")
+
+
+_twilio_client = None
+
+def twilio_client():
+    global _twilio_client
+    if _twilio_client is None:
+        from twilio.rest import Client
+        _twilio_client = Client(os.environ["TWILIO_ACCOUNT_SID"], os.environ["TWILIO_AUTH_TOKEN"])
+    return _twilio_client
+
+
 @app.route('/chat', methods=['POST'])
 def chat():
     """Este endpoint recibe JSON (para pruebas con Thunder Client)"""
@@ -383,38 +579,36 @@ def chat():
         data = request.get_json()
         user_message = data.get('message', '').strip()
         user_id = data.get('user_id', 'default_user')
+        stream = bool(data.get('stream')) or request.args.get('stream') == '1'
         print(f"📨 Mensaje de PRUEBA (JSON) de {user_id}: {user_message}")
 
-        session = assistant.user_sessions.get(user_id, {})
-        response_text = ""
-
-        if session.get('mode') == 'scoring':
-            response_text = assistant.handle_scoring_flow(user_message, user_id)
-        elif session.get('mode') == 'transfer':
-            response_text = assistant.handle_transfer_flow(user_message, user_id)
+        intent = _route_message(user_message, user_id)
+        if intent == "educational":
+            if stream:
+                return _sse_response(assistant.stream_educational_request(user_message, user_id), user_id)
+            response_text = assistant.handle_educational_request(user_message, user_id)
         else:
-            user_message_lower = user_message.lower()
-
-            if not user_message_lower or user_message_lower in ['hola', 'hi', 'inicio', 'start', 'menu']:
-                response_text = assistant.get_greeting()
+            response_text = _handle_routed(intent, user_message, user_id)
 
-            elif any(keyword in user_message_lower for keyword in ['1', 'educación', 'aprender', 'háblame', 'habrame', 'enseñame', 'dime', 'info']):
-                response_text = assistant.handle_educational_request(user_message, user_id)
-            elif any(keyword in user_message_lower for keyword in ['2', 'transferencia']):
-                response_text = assistant.start_transfer_flow(user_id)
-            elif any(keyword in user_message_lower for keyword in ['3', 'crédito', 'calcular', 'perfil']):
-                response_text = assistant.start_scoring_flow(user_id)
-            else:
-                response_text = assistant.handle_educational_request(user_message, user_id)
-        
+        if stream:
+            return _sse_response([response_text], user_id)
         return jsonify({"response": response_text, "session_id": user_id})
 
     except Exception as e:
         print(f"❌ Error en /chat: {e}")
         return jsonify({"response": "Error interno", "error": str(e)}), 500
 
+
+def _sse_response(chunks, user_id):
+    """Envia la respuesta como server-sent events: un evento por fragmento y uno final 'done'"""
+    def events():
+        for chunk in chunks:
+            yield f"data: {json.dumps({'delta': chunk}, ensure_ascii=False)}\n\n"
+        yield f"event: done\ndata: {json.dumps({'session_id': user_id})}\n\n"
+    return Response(events(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
 # --- Main (Corregido) ---
 if __name__ == '__main__':
     print("🌱 Iniciando Chatbot Financiero Agrícola...")
     print("📍 Servidor disponible en: http://localhost:5000")
-    app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
+    app.run(debug=True, host='0.0.0.0', port=5000, threaded=True)
\ No newline at end of file
@@ -0,0 +1,17 @@
+# gunicorn app:app -c gunicorn.conf.py
+# Un proceso con muchos hilos: mientras un hilo espera al modelo, los pasos de los flujos de
+# transferencia y scoring se atienden en los demas hilos sin esperar a la generacion.
+# Para usar varios workers sin duplicar los pesos del modelo en cada uno. Las sesiones y los MessageSid
+# ya procesados tienen que vivir en SQLite: el siguiente mensaje de un flujo, o el reintento de Twilio,
+# puede llegar a otro worker.
+#   WEB_WORKERS=4 CHATBOT_SHARED_WEIGHTS=1 SESSION_BACKEND=sqlite gunicorn app:app -c gunicorn.conf.py
+import os
+
+bind = os.environ.get("BIND", "0.0.0.0:5000")
+workers = int(os.environ.get("WEB_WORKERS", "1"))
+if workers > 1 and os.environ.get("SESSION_BACKEND", "memory") == "memory":
+    raise RuntimeError("Con WEB_WORKERS > 1 las sesiones y los MessageSid en memoria no se comparten entre workers; "
+                       "usa SESSION_BACKEND=sqlite")
+worker_class = "gthread"
+threads = int(os.environ.get("WEB_THREADS", "16"))
+timeout = 180
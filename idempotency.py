@@ -0,0 +1,166 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class _Entry:
+
+    def __init__(self, expires_at):
+        self.expires_at = expires_at
+        self.done = threading.Event()
+        self.response = None
+        self.failed = False
+
+
+class IdempotencyIndex:
+    """Recuerda los mensajes ya procesados (p. ej. MessageSid de Twilio) y la respuesta que se dio.
+
+    Un reintento con la misma llave devuelve la respuesta guardada sin volver a ejecutar el flujo;
+    si el original sigue en curso, el reintento espera a que termine.
+    """
+
+    def __init__(self, max_entries=10000, ttl_seconds=3600):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _begin(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry.expires_at >= now:
+                self.hits += 1
+                return entry, False
+            entry = _Entry(now + self.ttl_seconds)
+            self.entries.pop(key, None)
+            self.entries[key] = entry
+            self.misses += 1
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+            return entry, True
+
+    def run(self, key, handler, wait_timeout=None):
+        """Devuelve (respuesta, repetido). Lanza TimeoutError si el original no termina a tiempo."""
+        entry, owner = self._begin(key)
+        if not owner:
+            if not entry.done.wait(wait_timeout):
+                raise TimeoutError(f"El mensaje {key} se sigue procesando")
+            if entry.failed:
+                raise RuntimeError(f"El mensaje {key} fallo en su primer intento")
+            return entry.response, True
+
+        try:
+            entry.response = handler()
+        except Exception:
+            # Se olvida la llave para que el siguiente reintento vuelva a intentarlo
+            entry.failed = True
+            with self._lock:
+                if self.entries.get(key) is entry:
+                    del self.entries[key]
+            raise
+        finally:
+            entry.done.set()
+        return entry.response, False
+
+    def get_stats(self):
+        with self._lock:
+            return {"entries": len(self.entries), "hits": self.hits, "misses": self.misses}
+
+
+class SQLiteIdempotencyIndex:
+    """Igual que IdempotencyIndex pero en SQLite, compartido por todos los workers de gunicorn.
+
+    Un reintento de Twilio puede llegar a otro proceso: la fila 'pending' del primero lo hace esperar
+    en lugar de repetir el flujo. Si el proceso que la tomo muere, la fila vence tras pending_seconds
+    y otro reintento puede volver a procesar el mensaje.
+    """
+
+    POLL_SECONDS = 0.05
+
+    def __init__(self, db_path="sessions.db", ttl_seconds=3600, pending_seconds=120):
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.pending_seconds = pending_seconds
+        self.hits = 0
+        self.misses = 0
+        self._local = threading.local()
+        conn = self._connection()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS processed_messages ("
+            "key TEXT PRIMARY KEY, done INTEGER NOT NULL, response TEXT, expires_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_processed_expires ON processed_messages (expires_at)")
+        conn.commit()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _begin(self, key):
+        conn = self._connection()
+        now = time.time()
+        with conn:
+            conn.execute("DELETE FROM processed_messages WHERE expires_at <= ?", (now,))
+            inserted = conn.execute(
+                "INSERT OR IGNORE INTO processed_messages (key, done, response, expires_at) VALUES (?, 0, NULL, ?)",
+                (key, now + self.pending_seconds)
+            ).rowcount
+        return inserted == 1
+
+    def _wait(self, key, wait_timeout):
+        deadline = None if wait_timeout is None else time.monotonic() + wait_timeout
+        conn = self._connection()
+        while True:
+            row = conn.execute("SELECT done, response FROM processed_messages WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                raise RuntimeError(f"El mensaje {key} fallo en su primer intento")
+            if row[0]:
+                return json.loads(row[1])
+            if deadline is not None and time.monotonic() >= deadline:
+                raise TimeoutError(f"El mensaje {key} se sigue procesando")
+            time.sleep(self.POLL_SECONDS)
+
+    def run(self, key, handler, wait_timeout=None):
+        """Devuelve (respuesta, repetido). Lanza TimeoutError si el original no termina a tiempo."""
+        if not self._begin(key):
+            self.hits += 1
+            return self._wait(key, wait_timeout), True
+        self.misses += 1
+
+        conn = self._connection()
+        try:
+            response = handler()
+        except Exception:
+            # Se borra la llave para que el siguiente reintento vuelva a intentarlo
+            with conn:
+                conn.execute("DELETE FROM processed_messages WHERE key = ?", (key,))
+            raise
+        with conn:
+            conn.execute(
+                "UPDATE processed_messages SET done = 1, response = ?, expires_at = ? WHERE key = ?",
+                (json.dumps(response, ensure_ascii=False), time.time() + self.ttl_seconds, key)
+            )
+        return response, False
+
+    def get_stats(self):
+        entries = self._connection().execute("SELECT COUNT(*) FROM processed_messages").fetchone()[0]
+        return {"entries": entries, "hits": self.hits, "misses": self.misses}
+
+
+def create_idempotency_index(max_entries=10000, ttl_seconds=3600):
+    # Con SESSION_BACKEND=sqlite los MessageSid van a la misma base que las sesiones para que
+    # todos los workers los vean; en memoria solo sirve con un worker (ver gunicorn.conf.py)
+    if os.environ.get("SESSION_BACKEND", "memory") == "sqlite":
+        return SQLiteIdempotencyIndex(os.environ.get("SESSION_DB", "sessions.db"), ttl_seconds=ttl_seconds)
+    return IdempotencyIndex(max_entries=max_entries, ttl_seconds=ttl_seconds)
@@ -0,0 +1,264 @@
+import argparse
+import multiprocessing
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+
+# Cuentas de demostracion que se crean si la base esta vacia
+DEMO_ACCOUNTS = {
+    "ACC001": {"holder": "Sergio Rock", "balance": 1000.00},
+    "ACC002": {"holder": "Emilio Pinelo", "balance": 500.00}
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS accounts (
+    account_id TEXT PRIMARY KEY,
+    holder TEXT NOT NULL,
+    balance_cents INTEGER NOT NULL CHECK (balance_cents >= 0)
+);
+CREATE TABLE IF NOT EXISTS transfers (
+    transfer_id TEXT PRIMARY KEY,
+    reference TEXT UNIQUE,
+    from_account TEXT NOT NULL REFERENCES accounts (account_id),
+    to_account TEXT NOT NULL REFERENCES accounts (account_id),
+    amount_cents INTEGER NOT NULL CHECK (amount_cents > 0),
+    user_id TEXT,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS entries (
+    entry_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    transfer_id TEXT NOT NULL REFERENCES transfers (transfer_id),
+    account_id TEXT NOT NULL REFERENCES accounts (account_id),
+    amount_cents INTEGER NOT NULL,
+    balance_after_cents INTEGER NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_entries_account ON entries (account_id, entry_id);
+CREATE TRIGGER IF NOT EXISTS entries_no_update BEFORE UPDATE ON entries
+BEGIN SELECT RAISE(ABORT, 'los movimientos no se pueden modificar'); END;
+CREATE TRIGGER IF NOT EXISTS entries_no_delete BEFORE DELETE ON entries
+BEGIN SELECT RAISE(ABORT, 'los movimientos no se pueden borrar'); END;
+"""
+
+
+class LedgerError(Exception):
+    pass
+
+
+class AccountNotFoundError(LedgerError):
+    pass
+
+
+class InsufficientFundsError(LedgerError):
+
+    def __init__(self, account_id, available):
+        super().__init__(f"Fondos insuficientes en {account_id}")
+        self.account_id = account_id
+        self.available = available
+
+
+def to_cents(amount):
+    return int(round(amount * 100))
+
+
+class Ledger:
+    """Saldos en centavos sobre SQLite (WAL). Cada transferencia es una transaccion BEGIN IMMEDIATE que
+    debita, acredita y agrega dos movimientos a la tabla entries, que solo admite inserciones."""
+
+    def __init__(self, db_path="ledger.db", accounts=None, synchronous="FULL"):
+        self.db_path = db_path
+        self.synchronous = synchronous
+        self._local = threading.local()
+        conn = self._connection()
+        conn.executescript(SCHEMA)
+        if accounts:
+            with self._transaction() as conn:
+                conn.executemany(
+                    "INSERT OR IGNORE INTO accounts (account_id, holder, balance_cents) VALUES (?, ?, ?)",
+                    [(account_id, data["holder"], to_cents(data["balance"])) for account_id, data in accounts.items()]
+                )
+
+    def _connection(self):
+        # Una conexion por hilo; isolation_level=None para controlar BEGIN/COMMIT a mano
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(f"PRAGMA synchronous={self.synchronous}")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+        return conn
+
+    def _transaction(self):
+        return _ImmediateTransaction(self._connection())
+
+    def get_account(self, account_id):
+        row = self._connection().execute(
+            "SELECT holder, balance_cents FROM accounts WHERE account_id = ?", (account_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {"holder": row[0], "balance": row[1] / 100}
+
+    def __contains__(self, account_id):
+        return self.get_account(account_id) is not None
+
+    def transfer(self, from_account, to_account, amount, reference=None, user_id=None):
+        """Mueve amount de una cuenta a otra. Con la misma reference la transferencia se aplica una sola vez."""
+        amount_cents = to_cents(amount)
+        if amount_cents <= 0:
+            raise ValueError("El monto debe ser mayor a cero")
+        if from_account == to_account:
+            raise ValueError("La cuenta de origen y destino deben ser distintas")
+
+        with self._transaction() as conn:
+            if reference is not None:
+                existing = conn.execute(
+                    "SELECT transfer_id FROM transfers WHERE reference = ?", (reference,)
+                ).fetchone()
+                if existing:
+                    return self._transfer_result(conn, existing[0], duplicate=True)
+
+            accounts = dict(conn.execute(
+                "SELECT account_id, balance_cents FROM accounts WHERE account_id IN (?, ?)", (from_account, to_account)
+            ).fetchall())
+            for account_id in (from_account, to_account):
+                if account_id not in accounts:
+                    raise AccountNotFoundError(account_id)
+            if accounts[from_account] < amount_cents:
+                raise InsufficientFundsError(from_account, accounts[from_account] / 100)
+
+            now = time.time()
+            transfer_id = uuid.uuid4().hex
+            from_after = accounts[from_account] - amount_cents
+            to_after = accounts[to_account] + amount_cents
+            conn.execute("UPDATE accounts SET balance_cents = ? WHERE account_id = ?", (from_after, from_account))
+            conn.execute("UPDATE accounts SET balance_cents = ? WHERE account_id = ?", (to_after, to_account))
+            conn.execute(
+                "INSERT INTO transfers (transfer_id, reference, from_account, to_account, amount_cents, user_id, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (transfer_id, reference, from_account, to_account, amount_cents, user_id, now)
+            )
+            conn.executemany(
+                "INSERT INTO entries (transfer_id, account_id, amount_cents, balance_after_cents, created_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [(transfer_id, from_account, -amount_cents, from_after, now),
+                 (transfer_id, to_account, amount_cents, to_after, now)]
+            )
+            return self._transfer_result(conn, transfer_id)
+
+    def _transfer_result(self, conn, transfer_id, duplicate=False):
+        rows = conn.execute(
+            "SELECT account_id, amount_cents, balance_after_cents FROM entries WHERE transfer_id = ? ORDER BY entry_id",
+            (transfer_id,)
+        ).fetchall()
+        (from_account, debit, from_after), (to_account, _, to_after) = rows
+        return {
+            "transfer_id": transfer_id,
+            "from_account": from_account,
+            "to_account": to_account,
+            "amount": -debit / 100,
+            "balances": {from_account: from_after / 100, to_account: to_after / 100},
+            "duplicate": duplicate
+        }
+
+    def total_balance(self):
+        return self._connection().execute("SELECT COALESCE(SUM(balance_cents), 0) FROM accounts").fetchone()[0] / 100
+
+
+class _ImmediateTransaction:
+    # BEGIN IMMEDIATE toma el candado de escritura al inicio: dos transferencias nunca leen el mismo saldo
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False
+
+
+def create_ledger():
+    return Ledger(
+        os.environ.get("LEDGER_DB", "ledger.db"),
+        accounts=DEMO_ACCOUNTS,
+        synchronous=os.environ.get("LEDGER_SYNCHRONOUS", "FULL")
+    )
+
+
+def _benchmark_worker(db_path, synchronous, account_ids, threads, duration, results):
+    ledger = Ledger(db_path, synchronous=synchronous)
+    counts = {"ok": 0, "rechazadas": 0}
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def client():
+        rng = random.Random()
+        ok = rejected = 0
+        while time.monotonic() < deadline:
+            from_account, to_account = rng.sample(account_ids, 2)
+            try:
+                ledger.transfer(from_account, to_account, rng.randint(1, 5000) / 100)
+                ok += 1
+            except InsufficientFundsError:
+                rejected += 1
+        with lock:
+            counts["ok"] += ok
+            counts["rechazadas"] += rejected
+
+    workers = [threading.Thread(target=client) for _ in range(threads)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    results.put(counts)
+
+
+def benchmark(db_path, accounts=50, processes=2, threads=4, duration=5.0, synchronous="FULL"):
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(db_path + suffix):
+            os.remove(db_path + suffix)
+    account_ids = [f"B{i:04d}" for i in range(accounts)]
+    ledger = Ledger(db_path, accounts={a: {"holder": a, "balance": 1000.0} for a in account_ids}, synchronous=synchronous)
+    total_before = ledger.total_balance()
+
+    results = multiprocessing.Queue()
+    workers = [
+        multiprocessing.Process(target=_benchmark_worker,
+                                args=(db_path, synchronous, account_ids, threads, duration, results))
+        for _ in range(processes)
+    ]
+    start = time.perf_counter()
+    for p in workers:
+        p.start()
+    counts = [results.get() for _ in workers]
+    for p in workers:
+        p.join()
+    elapsed = time.perf_counter() - start
+
+    ok = sum(c["ok"] for c in counts)
+    rejected = sum(c["rechazadas"] for c in counts)
+    total_after = ledger.total_balance()
+    entries = ledger._connection().execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+    print(f"synchronous={synchronous}, {processes} procesos x {threads} hilos, {accounts} cuentas")
+    print(f"  {ok} transferencias en {elapsed:.1f}s -> {ok / elapsed:.0f} transferencias/s ({rejected} sin fondos)")
+    print(f"  Saldo total antes/despues: {total_before:.2f} / {total_after:.2f}; movimientos: {entries}")
+    return ok / elapsed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de transferencias concurrentes sobre el ledger")
+    parser.add_argument("--db", default="ledger_benchmark.db")
+    parser.add_argument("--accounts", type=int, default=50)
+    parser.add_argument("--processes", type=int, default=2)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--duration", type=float, default=5.0)
+    args = parser.parse_args()
+    for mode in ("FULL", "NORMAL"):
+        benchmark(args.db, args.accounts, args.processes, args.threads, args.duration, synchronous=mode)
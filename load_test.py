@@ -0,0 +1,78 @@
+import argparse
+import json
+import threading
+import time
+import urllib.request
+
+# Pasos de un flujo de transferencia que se cancela al final para no mover saldos
+FLOW_STEPS = ["2", "ACC001", "ACC002", "1", "no"]
+LLM_QUESTIONS = [
+    "háblame de cómo planear la siguiente siembra",
+    "dime cómo organizar los gastos de mi parcela",
+    "info sobre cómo elegir un buen préstamo para mi ganado",
+    "quiero aprender a separar el dinero de la casa y del campo",
+]
+
+
+def post_chat(base_url, user_id, message):
+    body = json.dumps({"message": message, "user_id": user_id}).encode("utf-8")
+    req = urllib.request.Request(f"{base_url}/chat", data=body, headers={"Content-Type": "application/json"})
+    start = time.perf_counter()
+    with urllib.request.urlopen(req, timeout=600) as resp:
+        resp.read()
+    return time.perf_counter() - start
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def run_load_test(base_url, flow_clients, llm_clients, duration):
+    latencies = {"flujo": [], "llm": []}
+    errors = {"flujo": 0, "llm": 0}
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def client(kind, idx):
+        i = 0
+        while time.monotonic() < deadline:
+            if kind == "flujo":
+                message = FLOW_STEPS[i % len(FLOW_STEPS)]
+            else:
+                # Un sufijo distinto por mensaje evita que la cache de respuestas oculte la generacion
+                message = f"{LLM_QUESTIONS[i % len(LLM_QUESTIONS)]} ({idx}-{i})"
+            try:
+                elapsed = post_chat(base_url, f"load-{kind}-{idx}", message)
+                with lock:
+                    latencies[kind].append(elapsed)
+            except Exception as e:
+                print(f"Error en cliente {kind}-{idx}: {e}")
+                with lock:
+                    errors[kind] += 1
+            i += 1
+
+    threads = [threading.Thread(target=client, args=("flujo", i)) for i in range(flow_clients)]
+    threads += [threading.Thread(target=client, args=("llm", i)) for i in range(llm_clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    print(f"{'Tipo':>6} | {'Peticiones':>10} | {'Errores':>7} | {'p50 (ms)':>9} | {'p95 (ms)':>9} | {'max (ms)':>9}")
+    for kind, values in latencies.items():
+        print(f"{kind:>6} | {len(values):>10} | {errors[kind]:>7} | {percentile(values, 50) * 1000:>9.1f} | "
+              f"{percentile(values, 95) * 1000:>9.1f} | {max(values, default=0) * 1000:>9.1f}")
+    return latencies
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prueba de carga mezclando pasos de flujo y preguntas al modelo")
+    parser.add_argument("--url", default="http://localhost:5000")
+    parser.add_argument("--flow-clients", type=int, default=8)
+    parser.add_argument("--llm-clients", type=int, default=4)
+    parser.add_argument("--duration", type=float, default=60)
+    args = parser.parse_args()
+    run_load_test(args.url, args.flow_clients, args.llm_clients, args.duration)
@@ -0,0 +1,87 @@
+import math
+import sys
+import time
+
+import torch
+
+from model.chatbot_model import FinancialChatbot, BACKENDS
+
+REPORT_PROMPTS = [
+    "¿Qué es un crédito de avío?",
+    "¿Cómo puedo ahorrar para la siguiente cosecha?",
+    "¿Qué es la tasa de interés?",
+    "¿Para qué sirve un seguro agrícola?",
+]
+
+
+def load_conversations(path, limit):
+    with open(path, 'r', encoding='utf-8') as f:
+        conversations = [c.strip() for c in f.read().split("\n\n") if c.strip()]
+    return conversations[:limit]
+
+
+def evaluate_perplexity(chatbot, conversations):
+    # La perdida se calcula a partir de los logits para que funcione igual con ONNX
+    total_loss = 0.0
+    total_tokens = 0
+    for conversation in conversations:
+        input_ids = chatbot.tokenizer(conversation, return_tensors="pt", truncation=True, max_length=256)['input_ids']
+        input_ids = input_ids.to(chatbot.device)
+        with torch.no_grad():
+            logits = chatbot.model(input_ids=input_ids, attention_mask=torch.ones_like(input_ids)).logits
+        loss = torch.nn.functional.cross_entropy(
+            logits[0, :-1].float(), input_ids[0, 1:], reduction='sum'
+        )
+        total_loss += loss.item()
+        total_tokens += input_ids.shape[1] - 1
+    return math.exp(total_loss / total_tokens)
+
+
+def evaluate_latency(chatbot, max_length):
+    chatbot.generate_response(REPORT_PROMPTS[0], max_length=8)
+    start = time.perf_counter()
+    for prompt in REPORT_PROMPTS:
+        chatbot.generate_response(prompt, max_length=max_length)
+    return (time.perf_counter() - start) / len(REPORT_PROMPTS)
+
+
+def backend_report(model_name="./fine-tuned-financial-chatbot", backends=BACKENDS,
+                   data_file="data/training/training_conversations.txt",
+                   output_file="backend_report.md", num_conversations=200, max_length=64):
+    torch.manual_seed(0)
+    conversations = load_conversations(data_file, num_conversations)
+    rows = []
+    for backend in backends:
+        print(f"\nEvaluando backend: {backend}")
+        try:
+            start = time.perf_counter()
+            chatbot = FinancialChatbot(model_name, kv_cache_bytes=0, backend=backend)
+            load_time = time.perf_counter() - start
+        except Exception as e:
+            print(f"Backend {backend} no disponible: {e}")
+            continue
+        perplexity = evaluate_perplexity(chatbot, conversations)
+        latency = evaluate_latency(chatbot, max_length)
+        rows.append((backend, load_time, latency, perplexity))
+        print(f"{backend}: carga {load_time:.1f}s, latencia {latency:.2f}s, perplejidad {perplexity:.2f}")
+        del chatbot
+
+    lines = [
+        f"# Reporte de backends ({model_name})",
+        "",
+        f"Latencia promedio de {len(REPORT_PROMPTS)} respuestas de {max_length} tokens; "
+        f"perplejidad sobre {len(conversations)} conversaciones de entrenamiento.",
+        "",
+        "| Backend | Carga (s) | Latencia (s) | Perplejidad |",
+        "|---|---|---|---|",
+    ]
+    for backend, load_time, latency, perplexity in rows:
+        lines.append(f"| {backend} | {load_time:.1f} | {latency:.2f} | {perplexity:.2f} |")
+    with open(output_file, 'w', encoding='utf-8') as f:
+        f.write("\n".join(lines) + "\n")
+    print(f"\nReporte guardado en {output_file}")
+    return rows
+
+
+if __name__ == "__main__":
+    backend_report(*sys.argv[1:2])
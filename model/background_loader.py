@@ -0,0 +1,41 @@
+import threading
+import time
+
+
+class BackgroundLoader:
+    """Carga un recurso en un hilo aparte. Mientras no termina, value es None y la app usa su modo fallback."""
+
+    def __init__(self, name, load):
+        self.name = name
+        self.value = None
+        self.state = "pendiente"
+        self.seconds = None
+        self._load = load
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"carga-{name}", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        self.state = "cargando"
+        start = time.perf_counter()
+        try:
+            self.value = self._load()
+            self.state = "listo" if self.value is not None else "no disponible"
+        except Exception as e:
+            print(f"❌ Error cargando {self.name}: {e}")
+            self.state = "error"
+        self.seconds = round(time.perf_counter() - start, 2)
+        self._done.set()
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+    @property
+    def ready(self):
+        return self._done.is_set()
+
+    def status(self):
+        return {"estado": self.state, "segundos": self.seconds}
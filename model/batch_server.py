@@ -0,0 +1,102 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class BatchedGenerator:
+
+    def __init__(self, chatbot, max_batch_size=8, max_wait_ms=25):
+        self.chatbot = chatbot
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.requests = queue.Queue()
+        self.stats = {"requests": 0, "batches": 0, "max_batch": 0}
+
+        self._worker = threading.Thread(target=self._run, name="batched-generator", daemon=True)
+        self._worker.start()
+
+    def generate(self, prompt, max_length=300, timeout=None):
+        future = Future()
+        self.requests.put((prompt, max_length, future))
+        return future.result(timeout=timeout)
+
+    def _collect_batch(self):
+        batch = [self.requests.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.requests.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+
+            # Un solo generate por longitud maxima pedida, para no alargar respuestas cortas
+            groups = {}
+            for prompt, max_length, future in batch:
+                groups.setdefault(max_length, []).append((prompt, future))
+
+            for max_length, items in groups.items():
+                prompts = [prompt for prompt, _ in items]
+                try:
+                    # Una peticion sola aprovecha el contexto fijo ya calculado en la cache de claves/valores
+                    if len(prompts) == 1:
+                        responses = [self.chatbot.generate_response(prompts[0], max_length=max_length)]
+                    else:
+                        responses = self.chatbot.generate_batch(prompts, max_length=max_length)
+                except Exception as e:
+                    for _, future in items:
+                        future.set_exception(e)
+                    continue
+                for (_, future), response in zip(items, responses):
+                    future.set_result(response)
+
+                self.stats["batches"] += 1
+                self.stats["requests"] += len(items)
+                self.stats["max_batch"] = max(self.stats["max_batch"], len(items))
+
+
+def benchmark(chatbot, concurrency_levels=(1, 2, 4, 8, 16), requests_per_client=2, max_length=64):
+    prompts = [
+        "¿Qué es un crédito de avío?",
+        "¿Cómo puedo ahorrar para la siguiente cosecha?",
+        "¿Qué es la tasa de interés?",
+        "¿Para qué sirve un seguro agrícola?",
+    ]
+
+    def run_clients(generate, concurrency):
+        generated_tokens = [0] * concurrency
+
+        def client(idx):
+            for i in range(requests_per_client):
+                response = generate(prompts[(idx + i) % len(prompts)], max_length)
+                generated_tokens[idx] += len(chatbot.tokenizer(response)['input_ids'])
+
+        threads = [threading.Thread(target=client, args=(i,)) for i in range(concurrency)]
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - start
+        return sum(generated_tokens) / elapsed
+
+    batched = BatchedGenerator(chatbot, max_batch_size=max(concurrency_levels))
+    print(f"{'Concurrencia':>12} | {'Sin lotes (tok/s)':>18} | {'Con lotes (tok/s)':>18}")
+    for concurrency in concurrency_levels:
+        unbatched_tps = run_clients(lambda p, n: chatbot.generate_response(p, max_length=n), concurrency)
+        batched_tps = run_clients(lambda p, n: batched.generate(p, max_length=n), concurrency)
+        print(f"{concurrency:>12} | {unbatched_tps:>18.1f} | {batched_tps:>18.1f}")
+    print(f"Estadísticas del servidor por lotes: {batched.stats}")
+
+
+if __name__ == "__main__":
+    from model.chatbot_model import FinancialChatbot
+    benchmark(FinancialChatbot())
@@ -1,78 +1,210 @@
 from transformers import AutoTokenizer, AutoModelForCausalLM, TrainingArguments, Trainer
-from transformers import TextDataset, DataCollatorForLanguageModeling
+from transformers import DataCollatorForSeq2Seq, TextIteratorStreamer
+from transformers.pytorch_utils import Conv1D
+from threading import Thread
 import torch
+import fcntl
+import json
 import os
+from model.kv_cache import PrefixCache, SYSTEM_KEY, as_dynamic_cache
+from model.shared_weights import load_shared_model, weights_fingerprint
+from model.token_dataset import PackedConversationDataset, build_token_dataset, is_token_dataset_current
+from model.training_metrics import ThroughputCallback, TokenCountingCollator
+
+BACKENDS = ("fp32", "int8", "onnx")
+ONNX_CACHE_DIR = "./onnx-cache"
+# Atencion (c_attn, c_proj) y MLP (c_proj) de GPT-2; fan_in_fan_out porque son Conv1D
+LORA_TARGET_MODULES = ["c_attn", "c_proj"]
+ERROR_RESPONSE = "Lo siento, hubo un error procesando tu pregunta."
+
+
+def _require_peft():
+    try:
+        import peft
+    except ImportError:
+        raise ImportError("Los adaptadores LoRA requieren: pip install peft")
+    return peft
+
+
+def adapter_base_model(adapter_path):
+    # peft guarda en adapter_config.json el modelo base sobre el que se entreno el adaptador
+    with open(os.path.join(adapter_path, "adapter_config.json"), 'r', encoding='utf-8') as f:
+        return json.load(f)["base_model_name_or_path"]
+
+
+def _conv1d_to_linear(module):
+    # GPT-2 usa Conv1D (pesos transpuestos) y quantize_dynamic solo cuantiza nn.Linear
+    for name, child in module.named_children():
+        if isinstance(child, Conv1D):
+            nx, nf = child.weight.shape
+            linear = torch.nn.Linear(nx, nf)
+            linear.weight.data = child.weight.data.t().contiguous()
+            linear.bias.data = child.bias.data
+            setattr(module, name, linear)
+        else:
+            _conv1d_to_linear(child)
+    return module
+
 
 class FinancialChatbot:
 
-    def __init__(self, model_name="microsoft/DialoGPT-medium"):
-        self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    def __init__(self, model_name="microsoft/DialoGPT-medium", kv_cache_bytes=64 * 1024 * 1024, backend="fp32",
+                 adapter_path=None, shared_weights=False):
+        if backend not in BACKENDS:
+            raise ValueError(f"Backend desconocido: {backend}. Opciones: {', '.join(BACKENDS)}")
+        if adapter_path and backend == "onnx":
+            raise ValueError("Los adaptadores LoRA no se pueden aplicar con el backend onnx")
+        if shared_weights and backend != "fp32":
+            raise ValueError("Los pesos compartidos solo estan disponibles con el backend fp32")
+        self.backend = backend
+        self.device = torch.device("cuda" if torch.cuda.is_available() and backend == "fp32" else "cpu")
+        # El modelo ONNX maneja su propia cache y no acepta DynamicCache
+        self.prefix_cache = PrefixCache(kv_cache_bytes) if kv_cache_bytes and backend != "onnx" else None
 
         try:
             self.tokenizer = AutoTokenizer.from_pretrained(model_name)
-            self.model = AutoModelForCausalLM.from_pretrained(model_name)
+            if shared_weights:
+                self.model = load_shared_model(
+                    model_name, lambda: self._load_model(model_name, backend, adapter_path), adapter_path
+                )
+            else:
+                self.model = self._load_model(model_name, backend, adapter_path)
 
             if self.tokenizer.pad_token is None:
                 self.tokenizer.pad_token = self.tokenizer.eos_token
 
-            self.model.to(self.device)
-            print("Modelo cargado")
+            if backend != "onnx":
+                self.model.to(self.device)
+                self.model.eval()
+            print(f"Modelo cargado (backend: {backend})")
 
         except Exception as e:
             print(f"Error cargando modelo: {e}")
             raise
 
-    def prepare_dataset(self, file_path):
-        try:
-            dataset = TextDataset(
-                tokenizer=self.tokenizer,
-                file_path=file_path,
-                block_size=128
+    def _load_model(self, model_name, backend, adapter_path=None):
+        if backend == "onnx":
+            try:
+                from optimum.onnxruntime import ORTModelForCausalLM
+            except ImportError:
+                raise ImportError("El backend 'onnx' requiere: pip install optimum[onnxruntime]")
+            return self._load_onnx_model(ORTModelForCausalLM, model_name)
+
+        model = AutoModelForCausalLM.from_pretrained(model_name)
+        if adapter_path:
+            # Se fusiona el adaptador en los pesos: la inferencia queda igual de rapida que sin LoRA
+            peft = _require_peft()
+            model = peft.PeftModel.from_pretrained(model, adapter_path).merge_and_unload()
+            print(f"Adaptador LoRA fusionado desde: {adapter_path}")
+        if backend == "int8":
+            model = torch.quantization.quantize_dynamic(
+                _conv1d_to_linear(model), {torch.nn.Linear}, dtype=torch.qint8
             )
+        return model
+
+    def _load_onnx_model(self, ort_model_class, model_name):
+        # El grafo exportado va en una cache aparte con la huella de los pesos de origen: si
+        # train_model.py reentrena el modelo cambia la huella y se vuelve a exportar
+        name = os.path.basename(os.path.normpath(model_name))
+        onnx_dir = os.path.join(ONNX_CACHE_DIR, f"{name}-{weights_fingerprint(model_name)}")
+        os.makedirs(ONNX_CACHE_DIR, exist_ok=True)
+        with open(onnx_dir + ".lock", 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                if not os.path.exists(onnx_dir):
+                    print(f"Exportando {model_name} a ONNX...")
+                    model = ort_model_class.from_pretrained(model_name, export=True)
+                    model.save_pretrained(onnx_dir + ".tmp")
+                    os.replace(onnx_dir + ".tmp", onnx_dir)
+                    print(f"Modelo ONNX exportado a: {onnx_dir}")
+                    return model
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+        return ort_model_class.from_pretrained(onnx_dir)
+
+    def prepare_dataset(self, file_path, block_size=128):
+        try:
+            # Se tokeniza una sola vez a disco y se mapea en memoria; solo se regenera si cambia el texto
+            prefix = os.path.splitext(file_path)[0] + ".tokens"
+            if not is_token_dataset_current(prefix, file_path, self.tokenizer):
+                build_token_dataset(file_path, self.tokenizer, prefix)
+            dataset = PackedConversationDataset(prefix, block_size=block_size)
+            print(f"Dataset: {len(dataset)} bloques de hasta {block_size} tokens")
             return dataset
         except Exception as e:
             print(f"Error preparando dataset: {e}")
             raise
 
-    def fine_tune(self, train_file, output_dir="./fine-tuned-model"):
+    def _wrap_lora(self, r, alpha, dropout):
+        peft = _require_peft()
+        config = peft.LoraConfig(
+            task_type="CAUSAL_LM",
+            r=r,
+            lora_alpha=alpha,
+            lora_dropout=dropout,
+            target_modules=LORA_TARGET_MODULES,
+            fan_in_fan_out=True
+        )
+        model = peft.get_peft_model(self.model, config)
+        model.print_trainable_parameters()
+        return model
+
+    def fine_tune(self, train_file, output_dir="./fine-tuned-model", batch_size=8, gradient_accumulation_steps=2,
+                  use_lora=False, lora_r=8, lora_alpha=16, lora_dropout=0.05, resume_from_checkpoint=None):
 
         if not os.path.exists(train_file):
             print(f"Archivo no encontrado: {train_file}")
             return False
+        if self.backend != "fp32":
+            print(f"El entrenamiento requiere el backend fp32 (actual: {self.backend})")
+            return False
         
         try:
             train_dataset = self.prepare_dataset(train_file)
+            # Con LoRA solo se entrenan las matrices de bajo rango; checkpoints y salida guardan solo el adaptador
+            model = self._wrap_lora(lora_r, lora_alpha, lora_dropout) if use_lora else self.model
             
-            data_collator = DataCollatorForLanguageModeling(
+            # Rellena cada batch solo hasta su bloque mas largo (multiplo de 8) y enmascara el padding en labels
+            data_collator = TokenCountingCollator(DataCollatorForSeq2Seq(
                 tokenizer=self.tokenizer,
-                mlm=False
-            )
+                label_pad_token_id=-100,
+                pad_to_multiple_of=8
+            ))
             
             # Parametros de entrenamiento, duracion aproximada de 8-10 horas. Nos hubiera gustado mas tiempo de
             # entrenamiento, sin embargo no nos adecuamos al tiempo del hack.
+            # El warmup se mantiene en ~1000 ejemplos aunque cambie el batch efectivo
+            examples_per_step = batch_size * gradient_accumulation_steps
             training_args = TrainingArguments(
                 output_dir=output_dir,
                 overwrite_output_dir=True,
                 num_train_epochs=3,             
-                per_device_train_batch_size=2,  
+                per_device_train_batch_size=batch_size,
+                gradient_accumulation_steps=gradient_accumulation_steps,
+                group_by_length=True,
                 save_steps=1000,                  
                 save_total_limit=2,               
                 prediction_loss_only=True,
                 remove_unused_columns=False,
-                warmup_steps=500,  
+                warmup_steps=max(1, 1000 // examples_per_step),
+                learning_rate=2e-4 if use_lora else 5e-5,
                 logging_steps=100,
             )
             
             trainer = Trainer(
-                model=self.model,
+                model=model,
                 args=training_args,
                 data_collator=data_collator,
                 train_dataset=train_dataset,
+                callbacks=[ThroughputCallback(data_collator)],
             )
             
-            trainer.train()
+            trainer.train(resume_from_checkpoint=resume_from_checkpoint)
             trainer.save_model()
             self.tokenizer.save_pretrained(output_dir)
+            if use_lora:
+                self.model = model.merge_and_unload()
+            self.model.eval()
             print(f"Modelo guardado en {output_dir}")
             return True
             
@@ -80,33 +212,126 @@ class FinancialChatbot:
             print(f"Error en el entrenamiento: {e}")
             return False
 
+    def _format_prompt(self, prompt):
+        return f"Usuario: {prompt}\nAsistente:"
+
+    def _extract_response(self, text):
+        if "Asistente:" in text:
+            text = text.split("Asistente:")[-1].strip()
+        return text
+
+    def warm_prefix(self, prompt_prefix):
+        # Precalcula las claves/valores del contexto fijo que comparten todos los prompts
+        if not self.prefix_cache:
+            return
+        input_ids = self.tokenizer(f"Usuario: {prompt_prefix}", return_tensors="pt")['input_ids'].to(self.device)
+        with torch.no_grad():
+            outputs = self.model(input_ids=input_ids, use_cache=True)
+        self.prefix_cache.pin(SYSTEM_KEY, input_ids[0].tolist(), as_dynamic_cache(outputs.past_key_values))
+
     def generate_response(self, prompt, max_length=300):
         try:
-            formatted_prompt = f"Usuario: {prompt}\nAsistente:"
+            formatted_prompt = self._format_prompt(prompt)
             
             inputs = self.tokenizer(
                 formatted_prompt, 
                 return_tensors="pt"
             ).to(self.device)
 
+            # El contexto fijo ya esta calculado: solo se procesan los tokens que vienen despues
+            cache_kwargs = {}
+            if self.prefix_cache is not None:
+                past, _ = self.prefix_cache.lookup(inputs['input_ids'][0].tolist())
+                if past is not None:
+                    cache_kwargs['past_key_values'] = past
+
             with torch.no_grad():
                 outputs = self.model.generate(
                     **inputs,
+                    **cache_kwargs,
                     max_length=len(inputs['input_ids'][0]) + max_length, 
                     num_return_sequences=1,
                     temperature=0.7,
                     do_sample=True,
                     pad_token_id=self.tokenizer.eos_token_id,
-                    no_repeat_ngram_size=2
+                    no_repeat_ngram_size=2,
+                    use_cache=True
                 )
             
             response = self.tokenizer.decode(outputs[0], skip_special_tokens=True)
-            
-            if "Asistente:" in response:
-                response = response.split("Asistente:")[-1].strip()
-            
-            return response
+            return self._extract_response(response)
             
         except Exception as e:
             print(f"Error generando respuesta: {e}")
-            return "Lo siento, hubo un error procesando tu pregunta."
+            return ERROR_RESPONSE
+
+    def stream_response(self, prompt, max_length=300):
+        try:
+            formatted_prompt = self._format_prompt(prompt)
+
+            inputs = self.tokenizer(
+                formatted_prompt,
+                return_tensors="pt"
+            ).to(self.device)
+
+            streamer = TextIteratorStreamer(self.tokenizer, skip_prompt=True, skip_special_tokens=True, timeout=120)
+            generation_kwargs = dict(
+                **inputs,
+                streamer=streamer,
+                max_length=len(inputs['input_ids'][0]) + max_length,
+                num_return_sequences=1,
+                temperature=0.7,
+                do_sample=True,
+                pad_token_id=self.tokenizer.eos_token_id,
+                no_repeat_ngram_size=2
+            )
+
+            # generate corre en otro hilo y el streamer entrega el texto conforme se decodifica
+            thread = Thread(target=self._generate_no_grad, kwargs=generation_kwargs, daemon=True)
+            thread.start()
+            for text in streamer:
+                if text:
+                    yield text
+            thread.join()
+
+        except Exception as e:
+            print(f"Error generando respuesta en streaming: {e}")
+            yield ERROR_RESPONSE
+
+    def _generate_no_grad(self, **kwargs):
+        with torch.no_grad():
+            self.model.generate(**kwargs)
+
+    def generate_batch(self, prompts, max_length=300):
+        try:
+            formatted_prompts = [self._format_prompt(prompt) for prompt in prompts]
+
+            # Padding a la izquierda para que todas las continuaciones empiecen en la misma posicion
+            padding_side = self.tokenizer.padding_side
+            self.tokenizer.padding_side = "left"
+            try:
+                inputs = self.tokenizer(
+                    formatted_prompts,
+                    return_tensors="pt",
+                    padding=True
+                ).to(self.device)
+            finally:
+                self.tokenizer.padding_side = padding_side
+
+            with torch.no_grad():
+                outputs = self.model.generate(
+                    **inputs,
+                    max_new_tokens=max_length,
+                    num_return_sequences=1,
+                    temperature=0.7,
+                    do_sample=True,
+                    pad_token_id=self.tokenizer.eos_token_id,
+                    no_repeat_ngram_size=2
+                )
+
+            responses = self.tokenizer.batch_decode(outputs, skip_special_tokens=True)
+            return [self._extract_response(response) for response in responses]
+
+        except Exception as e:
+            print(f"Error generando respuestas en lote: {e}")
+            return [ERROR_RESPONSE] * len(prompts)
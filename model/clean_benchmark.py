@@ -0,0 +1,86 @@
+import os
+import re
+import sys
+import time
+import tracemalloc
+
+from model.pdf_processer import PDFProcessor, iter_pdf_pages
+
+
+# Implementacion anterior de PDFProcessor.clean_text, solo para comparar
+def legacy_clean_text(text):
+
+    text = re.sub(r'\n+', '\n', text)
+    text = re.sub(r'\s+', ' ', text)
+    
+    sentences = []
+    current_sentence = ""
+    for char in text:
+        current_sentence += char
+        if char in ['.', '!', '?', '\n']:
+            if len(current_sentence.strip()) > 10:
+                sentences.append(current_sentence.strip())
+            current_sentence = ""
+    if current_sentence.strip():
+        sentences.append(current_sentence.strip())
+
+    paragraphs = []
+    current_paragraph = ""
+    for sentence in sentences:
+        if len(sentence.split()) <= 3 or sentence.endswith(':'):
+            if current_paragraph:
+                paragraphs.append(current_paragraph.strip())
+            paragraphs.append(sentence.strip())
+            current_paragraph = ""
+        else:
+            current_paragraph += " " + sentence
+            if len(current_paragraph) > 200:
+                paragraphs.append(current_paragraph.strip())
+                current_paragraph = ""
+    if current_paragraph:
+        paragraphs.append(current_paragraph.strip())
+        
+    return [p for p in paragraphs if len(p.split()) > 5]
+
+
+def measure(function, trace_memory=False):
+    # tracemalloc frena mucho la ejecucion, por eso tiempo y memoria se miden por separado
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    result = function()
+    elapsed = time.perf_counter() - start
+    peak = 0
+    if trace_memory:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def benchmark_cleaning(pdf_directory="data/knowledge_base/"):
+    processor = PDFProcessor()
+    print(f"{'PDF':>40} | {'Método':>10} | {'Limpieza (MB/s)':>15} | {'Pico total (MB)':>15}")
+    for filename in sorted(os.listdir(pdf_directory)):
+        if not filename.lower().endswith('.pdf'):
+            continue
+        pdf_path = os.path.join(pdf_directory, filename)
+        pages = list(iter_pdf_pages(pdf_path))
+        size_mb = sum(len(page.encode('utf-8')) for page in pages) / 1e6
+
+        # Velocidad de la limpieza sola, con las paginas ya extraidas
+        legacy, legacy_time, _ = measure(lambda: legacy_clean_text("".join(pages)))
+        streamed, streamed_time, _ = measure(lambda: list(processor.iter_clean_paragraphs(pages)))
+        assert streamed == legacy
+
+        # Memoria de punta de extremo a extremo: la version anterior junta el documento completo
+        _, _, legacy_peak = measure(
+            lambda: len(legacy_clean_text("".join(iter_pdf_pages(pdf_path)))), trace_memory=True)
+        _, _, streamed_peak = measure(
+            lambda: sum(1 for _ in processor.iter_clean_paragraphs(iter_pdf_pages(pdf_path))), trace_memory=True)
+
+        for method, elapsed, peak in (("anterior", legacy_time, legacy_peak), ("streaming", streamed_time, streamed_peak)):
+            print(f"{filename[:40]:>40} | {method:>10} | {size_mb / elapsed:15.2f} | {peak / 1e6:15.2f}")
+
+
+if __name__ == "__main__":
+    benchmark_cleaning(*sys.argv[1:2])
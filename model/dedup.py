@@ -0,0 +1,97 @@
+import re
+import zlib
+from collections import Counter
+
+import numpy as np
+
+PAGE_MARKER_RE = re.compile(r'^\s*--- Página \d+ ---\s*$')
+DIGITS_RE = re.compile(r'\d+')
+SPACES_RE = re.compile(r'\s+')
+WORD_RE = re.compile(r'\w+')
+
+HEADER_LINES = 5
+FOOTER_LINES = 3
+
+
+def _line_signature(line):
+    # Los numeros de pagina cambian en cada hoja: "Página: 74 de156" y "Página: 75 de156" son la misma linea
+    return SPACES_RE.sub(' ', DIGITS_RE.sub('#', line)).strip().lower()
+
+
+def strip_page_boilerplate(pages, min_fraction=0.4, min_pages=3):
+    # Quita las marcas "--- Página N ---" y las lineas de encabezado/pie que se repiten en muchas paginas
+    page_lines = []
+    counts = Counter()
+    for page in pages:
+        lines = [line for line in page.split('\n') if line.strip() and not PAGE_MARKER_RE.match(line)]
+        page_lines.append(lines)
+        edge_lines = lines[:HEADER_LINES] + lines[-FOOTER_LINES:]
+        counts.update({_line_signature(line) for line in edge_lines})
+
+    threshold = max(min_pages, min_fraction * len(page_lines))
+    boilerplate = {signature for signature, count in counts.items() if count >= threshold}
+
+    for lines in page_lines:
+        body = len(lines) - FOOTER_LINES
+        kept = [
+            line for i, line in enumerate(lines)
+            if not ((i < HEADER_LINES or i >= body) and _line_signature(line) in boilerplate)
+        ]
+        yield "\n".join(kept) + "\n"
+
+
+class NearDuplicateFilter:
+
+    MERSENNE_PRIME = (1 << 61) - 1
+
+    def __init__(self, threshold=0.8, num_perm=64, bands=16, shingle_size=5, seed=42):
+        if num_perm % bands:
+            raise ValueError("num_perm debe ser multiplo de bands")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        rng = np.random.RandomState(seed)
+        self.a = rng.randint(1, 1 << 31, size=num_perm, dtype=np.uint64)
+        self.b = rng.randint(0, 1 << 31, size=num_perm, dtype=np.uint64)
+        self.buckets = {}
+        self.signatures = []
+        self.removed = 0
+
+    def _shingles(self, text):
+        words = WORD_RE.findall(text.lower())
+        if len(words) < self.shingle_size:
+            return {" ".join(words)}
+        return {" ".join(words[i:i + self.shingle_size]) for i in range(len(words) - self.shingle_size + 1)}
+
+    def signature(self, text):
+        hashes = np.fromiter((zlib.crc32(s.encode('utf-8')) for s in self._shingles(text)), dtype=np.uint64)
+        # (a*x + b) mod p para cada permutacion; los hashes de 32 bits evitan desbordar uint64
+        permuted = (hashes[:, None] * self.a[None, :] + self.b[None, :]) % self.MERSENNE_PRIME
+        return permuted.min(axis=0)
+
+    def is_duplicate(self, text):
+        signature = self.signature(text)
+        band_keys = [
+            (band, signature[band * self.rows:(band + 1) * self.rows].tobytes())
+            for band in range(self.bands)
+        ]
+        candidates = set()
+        for key in band_keys:
+            candidates.update(self.buckets.get(key, ()))
+        for candidate in candidates:
+            if np.mean(self.signatures[candidate] == signature) >= self.threshold:
+                self.removed += 1
+                return True
+
+        doc_id = len(self.signatures)
+        self.signatures.append(signature)
+        for key in band_keys:
+            self.buckets.setdefault(key, []).append(doc_id)
+        return False
+
+    def filter(self, paragraphs):
+        for paragraph in paragraphs:
+            if not self.is_duplicate(paragraph):
+                yield paragraph
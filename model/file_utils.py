@@ -0,0 +1,21 @@
+import hashlib
+import json
+import os
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def inputs_digest(paths, params=None):
+    # Huella de un conjunto de archivos y parametros; un archivo faltante tambien cuenta como estado
+    digest = hashlib.sha256()
+    for path in sorted(paths):
+        digest.update(path.encode('utf-8'))
+        digest.update(file_sha256(path).encode('ascii') if os.path.exists(path) else b"-")
+    digest.update(json.dumps(params or {}, sort_keys=True).encode('utf-8'))
+    return digest.hexdigest()
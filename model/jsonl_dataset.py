@@ -0,0 +1,75 @@
+import glob
+import json
+import os
+
+
+def shard_paths(path):
+    # data/x.jsonl -> data/x-00000.jsonl, data/x-00001.jsonl, ...
+    stem, _ = os.path.splitext(path)
+    return sorted(glob.glob(f"{glob.escape(stem)}-[0-9][0-9][0-9][0-9][0-9].jsonl"))
+
+
+def _shard_path(path, index):
+    stem, _ = os.path.splitext(path)
+    return f"{stem}-{index:05d}.jsonl"
+
+
+def _count_lines(path):
+    with open(path, 'rb') as f:
+        return sum(1 for _ in f)
+
+
+def write_jsonl(records, path, append=False, shard_size=None):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    if not shard_size:
+        count = 0
+        with open(path, 'a' if append else 'w', encoding='utf-8') as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                count += 1
+        return count
+
+    existing = shard_paths(path)
+    if not append:
+        for shard in existing:
+            os.remove(shard)
+        existing = []
+
+    # Al agregar se sigue llenando el ultimo shard antes de abrir uno nuevo
+    index = len(existing) - 1 if existing else 0
+    in_shard = _count_lines(existing[-1]) if existing else 0
+    count = 0
+    f = open(_shard_path(path, index), 'a', encoding='utf-8')
+    try:
+        for record in records:
+            if in_shard >= shard_size:
+                f.close()
+                index += 1
+                in_shard = 0
+                f = open(_shard_path(path, index), 'a', encoding='utf-8')
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            in_shard += 1
+            count += 1
+    finally:
+        f.close()
+    return count
+
+
+def iter_training_records(path):
+    # Lee un registro a la vez; tambien acepta el formato anterior (un arreglo JSON)
+    if path.endswith('.json') and os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            yield from json.load(f)
+        return
+
+    paths = [path] if os.path.exists(path) else shard_paths(path)
+    if not paths:
+        raise FileNotFoundError(path)
+    for file_path in paths:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
@@ -0,0 +1,127 @@
+import json
+import math
+import os
+from collections import Counter
+
+from model.text_utils import tokenize
+
+
+class KnowledgeIndex:
+
+    def __init__(self, paragraphs=None, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.paragraphs = []
+        self.postings = {}
+        self.doc_lengths = []
+        self.avg_doc_length = 0.0
+        if paragraphs:
+            self.build(paragraphs)
+
+    def build(self, paragraphs):
+        self.paragraphs = []
+        self.postings = {}
+        self.doc_lengths = []
+        seen = set()
+        for paragraph in paragraphs:
+            # Los PDFs repiten muchos parrafos, solo indexamos cada uno una vez
+            if paragraph in seen:
+                continue
+            seen.add(paragraph)
+            doc_id = len(self.paragraphs)
+            tokens = tokenize(paragraph)
+            self.paragraphs.append(paragraph)
+            self.doc_lengths.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                self.postings.setdefault(term, []).append([doc_id, tf])
+        total = sum(self.doc_lengths)
+        self.avg_doc_length = total / len(self.doc_lengths) if self.doc_lengths else 0.0
+        print(f"Índice de conocimiento construido: {len(self.paragraphs)} párrafos, {len(self.postings)} términos")
+        return self
+
+    def _idf(self, term):
+        df = len(self.postings.get(term, ()))
+        n = len(self.paragraphs)
+        return math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+    def search(self, query, top_k=3):
+        query_terms = set(tokenize(query))
+        if not query_terms or not self.paragraphs:
+            return []
+
+        scores = {}
+        matched_terms = {}
+        for term in query_terms:
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = self._idf(term)
+            for doc_id, tf in postings:
+                norm = 1 - self.b + self.b * self.doc_lengths[doc_id] / self.avg_doc_length
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + self.k1 * norm)
+                matched_terms[doc_id] = matched_terms.get(doc_id, 0) + 1
+
+        # Un termino con tf=1 en un parrafo de largo promedio aporta exactamente su idf: relative_score
+        # es 1.0 cuando todos los terminos aparecen asi, y baja con terminos faltantes o parrafos largos
+        max_score = sum(self._idf(term) for term in query_terms)
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
+        return [
+            {
+                'paragraph': self.paragraphs[doc_id],
+                'score': score,
+                'relative_score': score / max_score,
+                'matched_terms': matched_terms[doc_id],
+                'coverage': matched_terms[doc_id] / len(query_terms),
+                'length': self.doc_lengths[doc_id]
+            }
+            for doc_id, score in ranked
+        ]
+
+    def save(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        data = {
+            'k1': self.k1,
+            'b': self.b,
+            'paragraphs': self.paragraphs,
+            'postings': self.postings,
+            'doc_lengths': self.doc_lengths,
+            'avg_doc_length': self.avg_doc_length
+        }
+        # Cada proceso escribe su propio temporal; os.replace deja el indice completo de cualquiera de ellos
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp_path, path)
+        print(f"Índice de conocimiento guardado en {path}")
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        index = cls(k1=data['k1'], b=data['b'])
+        index.paragraphs = data['paragraphs']
+        index.postings = data['postings']
+        index.doc_lengths = data['doc_lengths']
+        index.avg_doc_length = data['avg_doc_length']
+        return index
+
+    def __len__(self):
+        return len(self.paragraphs)
+
+
+def build_knowledge_index(pdf_directory="data/knowledge_base/", index_path="data/knowledge_index.json", workers=None):
+    from model.pdf_processer import PDFProcessor
+
+    processor = PDFProcessor(workers=workers)
+    paragraphs = processor.process_pdf_directory(pdf_directory)
+    if not paragraphs:
+        return None
+    index = KnowledgeIndex(paragraphs)
+    index.save(index_path)
+    return index
+
+
+if __name__ == "__main__":
+    build_knowledge_index()
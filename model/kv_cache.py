@@ -0,0 +1,98 @@
+import copy
+import threading
+
+from transformers import DynamicCache
+
+SYSTEM_KEY = "__system__"
+
+
+def _common_prefix_length(a, b):
+    n = min(len(a), len(b))
+    i = 0
+    while i < n and a[i] == b[i]:
+        i += 1
+    return i
+
+
+def as_dynamic_cache(past):
+    # Versiones anteriores de transformers devuelven tuplas por capa
+    if isinstance(past, tuple):
+        return DynamicCache.from_legacy_cache(past)
+    return past
+
+
+def cache_nbytes(cache):
+    if hasattr(cache, "layers"):
+        tensors = [t for layer in cache.layers for t in (layer.keys, layer.values) if t is not None]
+    elif hasattr(cache, "key_cache"):
+        tensors = list(cache.key_cache) + list(cache.value_cache)
+    else:
+        tensors = [t for layer in cache for t in layer]
+    return sum(t.nelement() * t.element_size() for t in tensors)
+
+
+class PrefixCache:
+    """Claves/valores precalculados de prefijos fijos, como el contexto del sistema.
+
+    Las entradas se fijan con pin() y nunca se desalojan. No se guardan entradas por usuario: el prompt
+    repite el mensaje actual despues del historial, asi que un turno no es continuacion del anterior y
+    solo el contexto fijo se puede reutilizar.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, min_reuse_tokens=8):
+        self.max_bytes = max_bytes
+        self.min_reuse_tokens = min_reuse_tokens
+        self.entries = {}
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.reused_tokens = 0
+        self._lock = threading.Lock()
+
+    def pin(self, key, token_ids, past):
+        size = cache_nbytes(past)
+        with self._lock:
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.total_bytes -= previous[2]
+            if self.total_bytes + size > self.max_bytes:
+                print(f"⚠️ El prefijo {key} ({size} bytes) no cabe en la cache de claves/valores")
+                return False
+            self.entries[key] = (list(token_ids), past, size)
+            self.total_bytes += size
+            return True
+
+    def lookup(self, input_ids):
+        # Se usa el prefijo fijo que comparta mas tokens con el prompt
+        with self._lock:
+            best = None
+            best_length = 0
+            for key, (token_ids, _, _) in self.entries.items():
+                length = _common_prefix_length(token_ids, input_ids)
+                if length > best_length:
+                    best, best_length = key, length
+
+            # Al menos un token tiene que pasar por el modelo para obtener logits; con pocos tokens
+            # en comun copiar la cache cuesta mas que recalcularlos
+            best_length = min(best_length, len(input_ids) - 1)
+            if best is None or best_length < self.min_reuse_tokens:
+                self.misses += 1
+                return None, 0
+
+            # generate extiende la cache que recibe: se entrega una copia y la fijada queda intacta
+            past = copy.deepcopy(self.entries[best][1])
+            self.hits += 1
+            self.reused_tokens += best_length
+
+        past.crop(best_length)
+        return past, best_length
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "entries": len(self.entries),
+                "bytes": self.total_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "reused_tokens": self.reused_tokens
+            }
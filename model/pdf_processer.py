@@ -2,77 +2,264 @@ import fitz
 import os
 import re
 import json
+import itertools
+import multiprocessing
 import numpy as np
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from model.knowledge_index import KnowledgeIndex
+from model.dedup import NearDuplicateFilter, strip_page_boilerplate
+from model.jsonl_dataset import write_jsonl
+from model.file_utils import file_sha256
+
+# Cambiar al modificar la limpieza de texto para que los PDFs en cache se vuelvan a procesar
+PIPELINE_VERSION = 3
+PAGES_PER_TASK = 16
+# Rangos de paginas en vuelo por proceso: el pool va adelantado sin cargar todo el corpus en memoria
+TASKS_IN_FLIGHT_PER_WORKER = 2
+
+WHITESPACE_RE = re.compile(r'\s+')
+SENTENCE_RE = re.compile(r'[^.!?]*[.!?]')
+
+
+def extract_page_range(pdf_path, start, end):
+    # Funcion de modulo para poder ejecutarse en los procesos del pool
+    doc = fitz.open(pdf_path)
+    try:
+        return [f"\n--- Página {page_num + 1} ---\n" + doc[page_num].get_text() for page_num in range(start, end)]
+    finally:
+        doc.close()
+
+
+def iter_pdf_pages(pdf_path):
+    doc = fitz.open(pdf_path)
+    try:
+        for page_num, page in enumerate(doc):
+            yield f"\n--- Página {page_num + 1} ---\n" + page.get_text()
+    finally:
+        doc.close()
+
 
 class PDFProcessor:
     
-    def __init__(self):
+    def __init__(self, cache_dir="data/training/pdf_cache", workers=None, strip_boilerplate=True,
+                 dedup_threshold=0.8):
         self.processed_texts = []
+        self.cache_dir = cache_dir
+        self.workers = workers
+        self.strip_boilerplate = strip_boilerplate
+        self.dedup_threshold = dedup_threshold
 
     def extract_text_from_pdf(self, pdf_path):
 
         try:
             print(f"Extrayendo texto de: {pdf_path}")
             doc = fitz.open(pdf_path)
-            text = ""
-            for page_num, page in enumerate(doc):
-                text += f"\n--- Página {page_num + 1} ---\n"
-                text += page.get_text()
+            page_count = doc.page_count
             doc.close()
-            return text
+            return "".join(extract_page_range(pdf_path, 0, page_count))
         except Exception as e:
             print(f"Error procesando {pdf_path}: {e}")
             return ""
 
-    def clean_text(self, text):
+    def iter_sentences(self, chunks):
+        # Recibe el texto por partes (p. ej. pagina por pagina) y corta en cada '.', '!' o '?'.
+        # Solo el fragmento sin terminar se arrastra a la siguiente parte.
+        pending = ""
+        for chunk in chunks:
+            text = WHITESPACE_RE.sub(' ', pending + chunk)
+            end = 0
+            for match in SENTENCE_RE.finditer(text):
+                sentence = match.group().strip()
+                if len(sentence) > 10:
+                    yield sentence
+                end = match.end()
+            pending = text[end:]
+        if pending.strip():
+            yield pending.strip()
 
-        text = re.sub(r'\n+', '\n', text)
-        text = re.sub(r'\s+', ' ', text)
-        
-        sentences = []
-        current_sentence = ""
-        for char in text:
-            current_sentence += char
-            if char in ['.', '!', '?', '\n']:
-                if len(current_sentence.strip()) > 10:
-                    sentences.append(current_sentence.strip())
-                current_sentence = ""
-        if current_sentence.strip():
-            sentences.append(current_sentence.strip())
-
-        paragraphs = []
-        current_paragraph = ""
+    def iter_paragraphs(self, sentences):
+        parts = []
+        length = 0
         for sentence in sentences:
             if len(sentence.split()) <= 3 or sentence.endswith(':'):
-                if current_paragraph:
-                    paragraphs.append(current_paragraph.strip())
-                paragraphs.append(sentence.strip())
-                current_paragraph = ""
+                if parts:
+                    yield " ".join(parts)
+                yield sentence
+                parts = []
+                length = 0
             else:
-                current_paragraph += " " + sentence
-                if len(current_paragraph) > 200:
-                    paragraphs.append(current_paragraph.strip())
-                    current_paragraph = ""
-        if current_paragraph:
-            paragraphs.append(current_paragraph.strip())
-            
-        return [p for p in paragraphs if len(p.split()) > 5]
+                parts.append(sentence)
+                length += len(sentence) + 1
+                if length > 200:
+                    yield " ".join(parts)
+                    parts = []
+                    length = 0
+        if parts:
+            yield " ".join(parts)
+
+    def iter_clean_paragraphs(self, chunks):
+        for paragraph in self.iter_paragraphs(self.iter_sentences(chunks)):
+            if len(paragraph.split()) > 5:
+                yield paragraph
+
+    def clean_text(self, text):
+
+        return list(self.iter_clean_paragraphs([text]))
+
+    def _load_manifest(self):
+        manifest_path = os.path.join(self.cache_dir, "manifest.json")
+        try:
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+        if manifest.get('pipeline_version') != PIPELINE_VERSION:
+            return {}
+        return manifest.get('files', {})
+
+    def _save_manifest(self, files):
+        manifest_path = os.path.join(self.cache_dir, "manifest.json")
+        tmp_path = f"{manifest_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'pipeline_version': PIPELINE_VERSION, 'files': files}, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, manifest_path)
+
+    def _cache_path(self, digest):
+        return os.path.join(self.cache_dir, f"{digest}.jsonl")
+
+    def _iter_cached_paragraphs(self, digest):
+        with open(self._cache_path(digest), 'r', encoding='utf-8') as f:
+            for line in f:
+                yield json.loads(line)
+
+    def _iter_extracted_pdfs(self, pdf_paths):
+        # Cada PDF se divide en rangos de paginas que se reparten entre procesos. Se entrega
+        # (pdf_path, paginas, completo) en orden en cuanto termina su ultimo rango, un PDF a la vez;
+        # completo es False si fallo algun rango y faltan paginas.
+        plan = []
+        for pdf_path in pdf_paths:
+            try:
+                doc = fitz.open(pdf_path)
+                page_count = doc.page_count
+                doc.close()
+            except Exception as e:
+                print(f"Error procesando {pdf_path}: {e}")
+                page_count = None
+            plan.append((pdf_path, [(start, min(start + PAGES_PER_TASK, page_count))
+                                    for start in range(0, page_count or 0, PAGES_PER_TASK)],
+                         page_count is not None))
+
+        if self.workers == 1:
+            for pdf_path, ranges, complete in plan:
+                pages = []
+                for start, end in ranges:
+                    try:
+                        pages.extend(extract_page_range(pdf_path, start, end))
+                    except Exception as e:
+                        print(f"Error procesando {pdf_path}: {e}")
+                        complete = False
+                yield pdf_path, pages, complete
+            return
+
+        tasks = iter([(pdf_path, start, end) for pdf_path, ranges, _ in plan for start, end in ranges])
+        max_in_flight = TASKS_IN_FLIGHT_PER_WORKER * (self.workers or os.cpu_count() or 1)
+        # spawn y no fork: quien llama ya tiene hilos (BackgroundLoader, bitacora, torch) y hacer fork
+        # con hilos vivos puede dejar candados tomados en el proceso hijo
+        with ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            in_flight = deque()
+            for pdf_path, ranges, complete in plan:
+                pages = []
+                for _ in ranges:
+                    for task in itertools.islice(tasks, max_in_flight - len(in_flight)):
+                        in_flight.append(pool.submit(extract_page_range, *task))
+                    try:
+                        pages.extend(in_flight.popleft().result())
+                    except Exception as e:
+                        print(f"Error procesando {pdf_path}: {e}")
+                        complete = False
+                yield pdf_path, pages, complete
+
+    def _iter_new_paragraphs(self, pages, digest, complete=True):
+        # Los parrafos se escriben a la cache conforme salen; el archivo solo aparece si termina completo.
+        # Si faltan paginas no se guarda nada para que la siguiente corrida vuelva a extraer el PDF
+        chunks = strip_page_boilerplate(pages) if self.strip_boilerplate else pages
+        tmp_path = f"{self._cache_path(digest)}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for paragraph in self.iter_clean_paragraphs(chunks):
+                f.write(json.dumps(paragraph, ensure_ascii=False) + "\n")
+                yield paragraph
+        if pages and complete:
+            os.replace(tmp_path, self._cache_path(digest))
+        else:
+            os.remove(tmp_path)
+
+    def iter_pdf_directory(self, pdf_directory):
+        """Parrafos limpios y sin casi duplicados de todos los PDFs, uno por uno y sin cargar el corpus completo."""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        manifest = self._load_manifest()
+        filenames = sorted(f for f in os.listdir(pdf_directory) if f.lower().endswith('.pdf'))
+
+        # Solo se extraen los PDFs nuevos o modificados; el resto sale de la cache
+        digests = {}
+        pending = []
+        for filename in filenames:
+            digests[filename] = file_sha256(os.path.join(pdf_directory, filename))
+            cached = (manifest.get(filename, {}).get('sha256') == digests[filename]
+                      and os.path.exists(self._cache_path(digests[filename])))
+            if cached:
+                print(f"Sin cambios: {filename} ({manifest[filename]['paragraphs']} párrafos en cache)")
+            else:
+                pending.append(filename)
+        if pending:
+            print(f"\nProcesando {len(pending)} PDF(s) nuevos o modificados: {', '.join(pending)}")
+        extracted = self._iter_extracted_pdfs([os.path.join(pdf_directory, f) for f in pending])
+
+        counts = {}
+        incomplete = set()
+
+        def all_paragraphs():
+            for filename in filenames:
+                if filename in pending:
+                    _, pages, complete = next(extracted)
+                    if not complete:
+                        incomplete.add(filename)
+                    paragraphs = self._iter_new_paragraphs(pages, digests[filename], complete)
+                else:
+                    paragraphs = self._iter_cached_paragraphs(digests[filename])
+                counts[filename] = 0
+                for paragraph in paragraphs:
+                    counts[filename] += 1
+                    yield paragraph
+                if filename in incomplete:
+                    print(f"⚠️ {filename} quedó incompleto ({counts[filename]} párrafos); se reintentará en la siguiente corrida")
+                elif filename in pending:
+                    print(f"Extraídos {counts[filename]} párrafos de {filename}")
+
+        if self.dedup_threshold:
+            # Los duplicados se buscan en todo el corpus, incluidos los PDFs que salieron de la cache
+            dedup = NearDuplicateFilter(threshold=self.dedup_threshold)
+            yield from dedup.filter(all_paragraphs())
+            print(f"Descartados {dedup.removed} párrafos casi duplicados")
+        else:
+            yield from all_paragraphs()
+
+        self._save_manifest({
+            filename: {'sha256': digests[filename], 'paragraphs': counts[filename]}
+            for filename in filenames if counts[filename] and filename not in incomplete
+        })
 
     def process_pdf_directory(self, pdf_directory):
 
-        all_paragraphs = []
-        for filename in os.listdir(pdf_directory):
-            if filename.lower().endswith('.pdf'):
-                pdf_path = os.path.join(pdf_directory, filename)
-                print(f"\nProcesando: {filename}")
-                raw_text = self.extract_text_from_pdf(pdf_path)
-                if raw_text:
-                    paragraphs = self.clean_text(raw_text)
-                    all_paragraphs.extend(paragraphs)
-                    print(f"Extraídos {len(paragraphs)} párrafos de {filename}")
-        return all_paragraphs
+        return list(self.iter_pdf_directory(pdf_directory))
+
+    def save_training_data(self, training_data, output_file, append=False, shard_size=None):
 
-    def save_training_data(self, training_data, output_file):
+        # .jsonl: un ejemplo por linea, se puede agregar sin reescribir; .json: arreglo como antes
+        if output_file.endswith('.jsonl'):
+            count = write_jsonl(training_data, output_file, append=append, shard_size=shard_size)
+            print(f"{'Agregados' if append else 'Guardados'} {count} ejemplos en {output_file}")
+            return training_data
 
         os.makedirs(os.path.dirname(output_file), exist_ok=True)
         with open(output_file, 'w', encoding='utf-8') as f:
@@ -80,15 +267,16 @@ class PDFProcessor:
         print(f"Guardados {len(training_data)} ejemplos en {output_file}")
         return training_data
             
-    def create_training_data_knowledge(self, paragraphs):
-
-        training_data = []
+    def iter_training_data_knowledge(self, paragraphs):
         for paragraph in paragraphs:
             if len(paragraph.split()) > 6:
                 knowledge_chunk = self.extract_knowledge_essence(paragraph)
                 if knowledge_chunk:
-                    knowledge_examples = self.create_knowledge_examples(knowledge_chunk)
-                    training_data.extend(knowledge_examples)
+                    yield from self.create_knowledge_examples(knowledge_chunk)
+
+    def create_training_data_knowledge(self, paragraphs):
+
+        training_data = list(self.iter_training_data_knowledge(paragraphs))
         print(f"Creados {len(training_data)} ejemplos de entrenamiento variables")
         return training_data
 
@@ -165,16 +353,18 @@ def process_pdfs():
         return None
     
     print(f"📚 Encontrados {len(pdf_files)} archivos PDF")
-    paragraphs = processor.process_pdf_directory(pdf_directory)
-    print(f"\n📊 Total de párrafos extraídos: {len(paragraphs)}")
+    # Los parrafos salen de los PDFs directo al indice de busqueda que usa app.py, que es el unico
+    # que los guarda todos; de ahi se generan los ejemplos y se escriben al JSONL conforme salen
+    index = KnowledgeIndex(processor.iter_pdf_directory(pdf_directory))
+    print(f"\n📊 Total de párrafos extraídos: {len(index)}")
+    index.save("data/knowledge_index.json")
     
     # Usamos el NUEVO método de conocimiento
-    training_data = processor.create_training_data_knowledge(paragraphs)
-    
-    output_file = "data/training/financial_education_dataset.json"
-    processor.save_training_data(training_data, output_file)
+    output_file = "data/training/financial_education_dataset.jsonl"
+    count = write_jsonl(processor.iter_training_data_knowledge(index.paragraphs), output_file)
+    print(f"Guardados {count} ejemplos en {output_file}")
     
-    return training_data
+    return count
 
 if __name__ == "__main__":
     print("Iniciando procesamiento de PDFs")
@@ -0,0 +1,86 @@
+import threading
+import time
+from collections import OrderedDict
+
+from model.text_utils import tokenize
+
+
+class ResponseCache:
+
+    def __init__(self, max_entries=1000, ttl_seconds=6 * 3600, similarity_threshold=0.8, min_terms=2):
+        self.max_entries = max_entries
+        self.min_terms = min_terms
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.entries = OrderedDict()
+        self.term_index = {}
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _key(self, query):
+        # "¿Qué es crédito?" y "que es un credito" terminan en la misma llave. Con menos de min_terms
+        # ("dime más" -> {'dime'}) la llave no dice de que se pregunta y no se cachea
+        key = frozenset(tokenize(query))
+        return key if len(key) >= self.min_terms else None
+
+    def _remove(self, key):
+        self.entries.pop(key, None)
+        for term in key:
+            keys = self.term_index.get(term)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.term_index[term]
+
+    def _find_similar(self, key):
+        candidates = set()
+        for term in key:
+            candidates.update(self.term_index.get(term, ()))
+        best, best_similarity = None, 0.0
+        for candidate in candidates:
+            similarity = len(key & candidate) / len(key | candidate)
+            if similarity > best_similarity:
+                best, best_similarity = candidate, similarity
+        if best_similarity >= self.similarity_threshold:
+            return best
+        return None
+
+    def get(self, query):
+        key = self._key(query)
+        if not key:
+            return None
+        with self._lock:
+            match = key if key in self.entries else self._find_similar(key)
+            if match is not None:
+                response, stored_at = self.entries[match]
+                if time.monotonic() - stored_at <= self.ttl_seconds:
+                    self.entries.move_to_end(match)
+                    self.hits += 1
+                    return response
+                self._remove(match)
+            self.misses += 1
+            return None
+
+    def put(self, query, response):
+        key = self._key(query)
+        if not key or not response:
+            return
+        with self._lock:
+            self._remove(key)
+            self.entries[key] = (response, time.monotonic())
+            for term in key:
+                self.term_index.setdefault(term, set()).add(key)
+            while len(self.entries) > self.max_entries:
+                oldest = next(iter(self.entries))
+                self._remove(oldest)
+
+    def get_stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0
+            }
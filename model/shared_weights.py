@@ -0,0 +1,78 @@
+import fcntl
+import hashlib
+import json
+import os
+
+import torch
+from transformers import AutoConfig, AutoModelForCausalLM
+
+SHARED_WEIGHTS_DIR = "./shared-weights"
+
+
+def weights_fingerprint(model_name, adapter_path=None):
+    # Si se reentrena el modelo o el adaptador cambia la huella y se exporta un archivo nuevo
+    sources = {"model": model_name, "adapter": adapter_path}
+    for path in (model_name, adapter_path):
+        if path and os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                full_path = os.path.join(path, name)
+                if os.path.isfile(full_path):
+                    stat = os.stat(full_path)
+                    sources[full_path] = [stat.st_size, stat.st_mtime_ns]
+    return hashlib.sha256(json.dumps(sources, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+
+def shared_weights_path(model_name, adapter_path=None, directory=SHARED_WEIGHTS_DIR):
+    name = os.path.basename(os.path.normpath(model_name))
+    return os.path.join(directory, f"{name}-{weights_fingerprint(model_name, adapter_path)}.pt")
+
+
+def _all_tensors(model):
+    # Parametros y tambien buffers no persistentes, que state_dict() no incluye
+    tensors = {name: param.detach() for name, param in model.named_parameters()}
+    tensors.update({name: buffer for name, buffer in model.named_buffers()})
+    return tensors
+
+
+def _assign_tensors(model, tensors):
+    for name, tensor in tensors.items():
+        module_name, _, attr = name.rpartition('.')
+        module = model.get_submodule(module_name)
+        if attr in module._parameters:
+            module._parameters[attr] = torch.nn.Parameter(tensor, requires_grad=False)
+        else:
+            module._buffers[attr] = tensor
+
+
+def load_shared_model(model_name, build_model, adapter_path=None):
+    """Carga los pesos mapeando en memoria un archivo comun a todos los procesos.
+
+    El primer proceso que lo necesita construye el modelo con build_model() y lo exporta; los
+    demas (y el mismo) lo abren con mmap, de modo que las paginas de pesos viven una sola vez
+    en la cache del sistema operativo aunque haya varios workers de gunicorn.
+    """
+    path = shared_weights_path(model_name, adapter_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    with open(path + ".lock", 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            if not os.path.exists(path):
+                model = build_model()
+                torch.save(_all_tensors(model), path + ".tmp")
+                os.replace(path + ".tmp", path)
+                print(f"Pesos compartidos exportados a: {path}")
+                del model
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+    # Con el dispositivo meta no se reserva memoria para los pesos aleatorios iniciales
+    with torch.device("meta"):
+        model = AutoModelForCausalLM.from_config(AutoConfig.from_pretrained(model_name))
+    _assign_tensors(model, torch.load(path, mmap=True, weights_only=True))
+    model.tie_weights()
+    missing = [name for name, tensor in _all_tensors(model).items() if tensor.is_meta]
+    if missing:
+        raise ValueError(f"El archivo de pesos compartidos no contiene: {', '.join(missing)}")
+    print(f"Pesos mapeados en memoria desde: {path}")
+    return model
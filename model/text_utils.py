@@ -0,0 +1,31 @@
+import re
+import unicodedata
+
+STOPWORDS = {
+    'a', 'al', 'algo', 'como', 'con', 'cual', 'de', 'del', 'el', 'ella', 'en', 'es', 'esa',
+    'ese', 'eso', 'esta', 'este', 'esto', 'fue', 'ha', 'hay', 'la', 'las', 'le', 'les', 'lo',
+    'los', 'mas', 'me', 'mi', 'mis', 'muy', 'no', 'nos', 'o', 'para', 'pero', 'por', 'que',
+    'se', 'si', 'sin', 'sobre', 'son', 'su', 'sus', 'te', 'tu', 'tus', 'u', 'un', 'una',
+    'unas', 'unos', 'y', 'ya', 'yo'
+}
+
+_WORD_RE = re.compile(r'\w+')
+# Diacriticos combinables del bloque U+0300-U+036F (U+034F no es combinable)
+_ACCENT_RE = re.compile('[\u0300-\u034e\u0350-\u036f]')
+
+
+def normalize_text(text):
+    # Minusculas y sin acentos: "Crédito" y "credito" deben ser el mismo termino
+    if text.isascii():
+        return text.lower()
+    text = _ACCENT_RE.sub('', unicodedata.normalize('NFKD', text.lower()))
+    if text.isascii():
+        return text
+    return ''.join(c for c in text if not unicodedata.combining(c))
+
+
+def tokenize(text, remove_stopwords=True):
+    tokens = _WORD_RE.findall(normalize_text(text))
+    if remove_stopwords:
+        tokens = [t for t in tokens if len(t) > 1 and t not in STOPWORDS]
+    return tokens
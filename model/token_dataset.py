@@ -0,0 +1,143 @@
+import json
+import os
+from bisect import bisect_left
+
+import numpy as np
+from torch.utils.data import Dataset
+
+from model.file_utils import file_sha256
+
+TOKENIZE_CHUNK = 1000
+
+
+def iter_conversations(text_file):
+    # Las conversaciones del archivo de entrenamiento van separadas por una linea en blanco
+    lines = []
+    with open(text_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                lines.append(line.rstrip('\r\n'))
+            elif lines:
+                yield "\n".join(lines)
+                lines = []
+    if lines:
+        yield "\n".join(lines)
+
+
+def _metadata(text_file, tokenizer):
+    return {
+        'format': 2,
+        'source_sha256': file_sha256(text_file),
+        'tokenizer': tokenizer.name_or_path,
+        'vocab_size': len(tokenizer)
+    }
+
+
+def is_token_dataset_current(prefix, text_file, tokenizer):
+    try:
+        with open(prefix + ".json", 'r', encoding='utf-8') as f:
+            stored = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return False
+    return (os.path.exists(prefix + ".bin") and os.path.exists(prefix + ".idx")
+            and os.path.exists(prefix + ".turns") and stored == _metadata(text_file, tokenizer))
+
+
+def _turn_starts(text, offset_mapping):
+    # Indice del primer token de cada linea ("Usuario: ...", "Asistente: ...") salvo la primera
+    token_starts = [start for start, _ in offset_mapping]
+    turns = []
+    pos = text.find("\n")
+    while pos != -1:
+        i = bisect_left(token_starts, pos + 1)
+        if 0 < i < len(token_starts):
+            turns.append(i)
+        pos = text.find("\n", pos + 1)
+    return turns
+
+
+def build_token_dataset(text_file, tokenizer, prefix):
+    # prefix.bin: tokens uint16 seguidos; prefix.idx: offsets int64 (N+1) de cada conversacion;
+    # prefix.turns: posiciones int64 donde empieza cada turno, para partir conversaciones largas
+    if len(tokenizer) > np.iinfo(np.uint16).max:
+        raise ValueError("El vocabulario no cabe en uint16")
+
+    offsets = [0]
+    turns = []
+
+    def write_chunk(f, conversations):
+        # Los offsets de caracteres solo existen en tokenizers rapidos; sin ellos se parte por tamaño
+        encoded = tokenizer(conversations, return_offsets_mapping=tokenizer.is_fast)
+        for i, ids in enumerate(encoded['input_ids']):
+            if tokenizer.is_fast:
+                turns.extend(offsets[-1] + t for t in _turn_starts(conversations[i], encoded['offset_mapping'][i]))
+            ids.append(tokenizer.eos_token_id)
+            f.write(np.asarray(ids, dtype=np.uint16).tobytes())
+            offsets.append(offsets[-1] + len(ids))
+
+    with open(prefix + ".bin.tmp", 'wb') as f:
+        chunk = []
+        for conversation in iter_conversations(text_file):
+            chunk.append(conversation)
+            if len(chunk) >= TOKENIZE_CHUNK:
+                write_chunk(f, chunk)
+                chunk = []
+        if chunk:
+            write_chunk(f, chunk)
+
+    with open(prefix + ".idx.tmp", 'wb') as f:
+        np.save(f, np.asarray(offsets, dtype=np.int64))
+    with open(prefix + ".turns.tmp", 'wb') as f:
+        np.save(f, np.asarray(turns, dtype=np.int64))
+    os.replace(prefix + ".bin.tmp", prefix + ".bin")
+    os.replace(prefix + ".idx.tmp", prefix + ".idx")
+    os.replace(prefix + ".turns.tmp", prefix + ".turns")
+    with open(prefix + ".json", 'w', encoding='utf-8') as f:
+        json.dump(_metadata(text_file, tokenizer), f)
+
+    print(f"Dataset tokenizado: {len(offsets) - 1} conversaciones, {offsets[-1]} tokens en {prefix}.bin")
+    return prefix
+
+
+def pack_conversations(offsets, block_size, turns=()):
+    # Junta conversaciones completas y consecutivas mientras quepan en block_size.
+    # Una conversacion mas larga que el bloque se parte en varios bloques en el ultimo cambio
+    # de turno que quepa; solo un turno que por si solo no cabe se corta a media frase.
+    turns = np.asarray(turns, dtype=np.int64)
+    starts, ends = [], []
+    pack_start = None
+    for i in range(len(offsets) - 1):
+        start, end = int(offsets[i]), int(offsets[i + 1])
+        if pack_start is not None and end - pack_start <= block_size:
+            ends[-1] = end
+            continue
+        while end - start > block_size:
+            j = int(np.searchsorted(turns, start + block_size, side='right')) - 1
+            cut = int(turns[j]) if j >= 0 and turns[j] > start else start + block_size
+            starts.append(start)
+            ends.append(cut)
+            start = cut
+        # El resto (o la conversacion completa) puede compartir bloque con las siguientes
+        pack_start = start
+        starts.append(start)
+        ends.append(end)
+    return np.asarray(starts, dtype=np.int64), np.asarray(ends, dtype=np.int64)
+
+
+class PackedConversationDataset(Dataset):
+
+    def __init__(self, prefix, block_size=128):
+        self.tokens = np.memmap(prefix + ".bin", dtype=np.uint16, mode='r')
+        offsets = np.load(prefix + ".idx", mmap_mode='r')
+        turns = np.load(prefix + ".turns", mmap_mode='r')
+        self.starts, self.ends = pack_conversations(offsets, block_size, turns)
+        self.split_conversations = int(np.count_nonzero(np.diff(offsets) > block_size))
+        if self.split_conversations:
+            print(f"⚠️ {self.split_conversations} conversaciones superan {block_size} tokens y se partieron en varios bloques")
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __getitem__(self, i):
+        input_ids = self.tokens[self.starts[i]:self.ends[i]].tolist()
+        return {"input_ids": input_ids, "labels": list(input_ids)}
@@ -0,0 +1,43 @@
+import time
+
+from transformers import TrainerCallback
+
+
+class TokenCountingCollator:
+    # Envuelve al collator y cuenta solo los tokens reales (sin padding) de cada batch
+
+    def __init__(self, collator):
+        self.collator = collator
+        self.tokens = 0
+        self.padded_tokens = 0
+
+    def __call__(self, features):
+        batch = self.collator(features)
+        self.tokens += int(batch["attention_mask"].sum())
+        self.padded_tokens += batch["input_ids"].numel()
+        return batch
+
+
+class ThroughputCallback(TrainerCallback):
+
+    def __init__(self, counter):
+        self.counter = counter
+        self.start = None
+
+    def on_train_begin(self, args, state, control, **kwargs):
+        self.start = time.perf_counter()
+        self.counter.tokens = 0
+        self.counter.padded_tokens = 0
+
+    def _report(self, label):
+        elapsed = time.perf_counter() - self.start
+        tokens = self.counter.tokens
+        padding = 1 - tokens / self.counter.padded_tokens if self.counter.padded_tokens else 0.0
+        print(f"{label}: {tokens / elapsed:.0f} tokens/s ({tokens} tokens en {elapsed:.1f}s, padding {padding:.1%})")
+
+    def on_log(self, args, state, control, logs=None, **kwargs):
+        if self.start is not None and "loss" in (logs or {}):
+            self._report(f"Paso {state.global_step}")
+
+    def on_train_end(self, args, state, control, **kwargs):
+        self._report("Entrenamiento")
@@ -1,5 +1,5 @@
-import json
 import os
+from model.jsonl_dataset import iter_training_records
 
 class TrainingPreparer:
     
@@ -8,40 +8,35 @@ class TrainingPreparer:
     
     def convert_to_training_text(self, json_file, output_file):
 
+        # Se escribe registro por registro, sin cargar todo el dataset en memoria
+        os.makedirs(os.path.dirname(output_file), exist_ok=True)
+        count = 0
         try:
-            with open(json_file, 'r', encoding='utf-8') as f:
-                training_data = json.load(f)
+            with open(output_file + ".tmp", 'w', encoding='utf-8') as f:
+                for item in iter_training_records(json_file):
+                    f.write(f"Usuario: {item['input']}\nAsistente: {item['output']}\n\n")
+                    count += 1
         except FileNotFoundError:
             print(f"Archivo {json_file} no encontrado")
+            os.remove(output_file + ".tmp")
             return None
-        except json.JSONDecodeError:
+        except ValueError:
             print(f"Error decodificando desde {json_file}")
+            os.remove(output_file + ".tmp")
             return None
-        
-        training_texts = []
-        for item in training_data:
-            conversation = f"Usuario: {item['input']}\nAsistente: {item['output']}\n\n"
-            training_texts.append(conversation)
-        
-        os.makedirs(os.path.dirname(output_file), exist_ok=True)
-        with open(output_file, 'w', encoding='utf-8') as f:
-            f.writelines(training_texts)
+        os.replace(output_file + ".tmp", output_file)
         
         print(f"Archivo de entrenamiento creado: {output_file}")
-        print(f"Numero de conversaciones: {len(training_texts)}")
+        print(f"Numero de conversaciones: {count}")
         
         return output_file
 
 def prepare_training_data():
-
-    from model.chatbot_model import FinancialChatbot
     
     try:
-        chatbot = FinancialChatbot()
-        
         preparer = TrainingPreparer(tokenizer=None) 
         
-        input_file = "data/training/financial_education_dataset.json"
+        input_file = "data/training/financial_education_dataset.jsonl"
         output_file = "data/training/training_conversations.txt"
         
         result = preparer.convert_to_training_text(input_file, output_file)
@@ -0,0 +1,41 @@
+import re
+
+from model.text_utils import normalize_text
+
+# Intenciones en orden de prioridad: si un mensaje contiene palabras de varias, gana la primera.
+# Las palabras se comparan sin acentos y como subcadena, igual que los any(...) que reemplaza.
+INTENT_KEYWORDS = (
+    ("educational", ['1', 'educación', 'aprender', 'háblame', 'habrame', 'enseñame', 'dime', 'info']),
+    ("transfer", ['2', 'transferencia', 'pago']),
+    ("scoring", ['3', 'crédito', 'calcular', 'perfil']),
+)
+GREETINGS = ['hola', 'hi', 'inicio', 'start', 'menu']
+
+# Sesiones que ya estan dentro de un flujo: el mensaje es una respuesta, no una intencion nueva
+MODE_INTENTS = {"scoring": "scoring_flow", "transfer": "transfer_flow"}
+
+
+class MessageRouter:
+
+    def __init__(self, intents=INTENT_KEYWORDS, greetings=GREETINGS, default="educational"):
+        self.default = default
+        self.greetings = {normalize_text(g) for g in greetings}
+        # Una expresion por intencion, en orden de prioridad; gana la primera que aparezca en el mensaje.
+        # Busquedas simples por separado salen mas rapido que una sola alternancia de lookaheads (.*?), que
+        # reintenta cada palabra en cada posicion del mensaje (ver router_benchmark.py).
+        self.searches = []
+        for name, keywords in intents:
+            words = sorted({normalize_text(k) for k in keywords}, key=len, reverse=True)
+            self.searches.append((re.compile('|'.join(map(re.escape, words))).search, name))
+
+    def route(self, message, mode=None):
+        if mode in MODE_INTENTS:
+            return MODE_INTENTS[mode]
+        text = normalize_text(message.strip())
+        if not text or text in self.greetings:
+            return "greeting"
+        for search, name in self.searches:
+            if search(text):
+                return name
+        return self.default
+
@@ -0,0 +1,52 @@
+import argparse
+import time
+
+from router import MessageRouter
+
+
+def legacy_route(message, mode=None):
+    # Logica que tenia /webhook antes de router.py, solo para comparar
+    if mode == 'scoring':
+        return "scoring_flow"
+    if mode == 'transfer':
+        return "transfer_flow"
+    incoming_msg_lower = message.strip().lower()
+    edu_keywords = ['1', 'educación', 'aprender', 'háblame', 'habrame', 'enseñame', 'dime', 'info']
+    if not incoming_msg_lower or incoming_msg_lower in ['hola', 'hi', 'inicio', 'start', 'menu']:
+        return "greeting"
+    elif any(keyword in incoming_msg_lower for keyword in edu_keywords):
+        return "educational"
+    elif any(keyword in incoming_msg_lower for keyword in ['2', 'transferencia', 'pago']):
+        return "transfer"
+    elif any(keyword in incoming_msg_lower for keyword in ['3', 'crédito', 'calcular', 'perfil']):
+        return "scoring"
+    return "educational"
+
+
+MESSAGES = [
+    "", "hola", "Menú", "hola, quiero aprender", "1", "educación", "háblame del ahorro",
+    "enséñame a ahorrar", "dime qué es un interés", "INFO", "2", "Transferéncia",
+    "quiero hacer un pago", "3", "CRÉDITO", "mi perfil", "dime cómo pedir un crédito",
+    "pago de mi crédito", "¿qué siembro en otoño?",
+    "quisiera saber cuánto me cobran de comisión por mover dinero a otra cuenta del banco",
+    "tengo una parcela de maíz y quiero saber si me conviene pedir un préstamo para fertilizante",
+]
+
+
+def benchmark(iterations=200000):
+    router = MessageRouter()
+    rounds = iterations // len(MESSAGES) + 1
+    total = rounds * len(MESSAGES)
+    for label, route in (("any() por lista", legacy_route), ("regex compilada", router.route)):
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for message in MESSAGES:
+                route(message)
+        elapsed = time.perf_counter() - start
+        print(f"{label:>16}: {total / elapsed:>10.0f} mensajes/s ({elapsed / total * 1e6:.2f} us por mensaje)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mide el enrutador de mensajes contra la logica anterior")
+    parser.add_argument("--iterations", type=int, default=200000)
+    benchmark(parser.parse_args().iterations)
@@ -0,0 +1,166 @@
+import numpy as np
+
+MAP_UBICACION = {
+    'Chiapas': 0, 'Puebla': 1, 'Guanajuato': 2, 'Sonora': 3, 'Jalisco': 4,
+    'Veracruz': 5, 'Oaxaca': 6, 'Michoacan': 7, 'Sinaloa': 8, 'Hidalgo': 9,
+    'Ciudad de México': 10, 'Nuevo León' : 11, 'Guerrero': 12, 'Tamaulipas':13,
+    'Zacatecas': 14, 'San Luis Potosí': 15, 'Nayarit': 16, 'Otros': 17
+}
+MAP_TIPO_NEGOCIO = {
+    'Ganaderia - Aves': 0, 'Otras actividades pecuarias': 1, 'Hortalizas': 2,
+    'Granos': 3, 'Ganaderia - Bovinos': 4, 'Frutales': 5, 'Ganaderia - Porcinos': 6,
+    'Cultivos industriales/perennes': 7, 'Agricultura mixta': 8, 'Servicios y transformacion': 9
+}
+MAP_TAMANO_OPERACION = {'Pequeño': 0, 'Mediano': 1, 'Grande': 2}
+MAP_FRECUENCIA_INGRESOS = {'Constante': 0, 'Estacional': 1}
+MAP_ESCOLARIDAD = {
+    'Primaria': 0, 'Secundaria': 1, 'Preparatoria': 2,
+    'Universidad': 3, 'Sin estudios': 4
+}
+MAP_SCORE_NAMES = {0: 'Bueno', 1: 'Regular', 2: 'Malo'}
+SCORING_FEATURES_ORDER = [
+    'Edad', 'Ubicacion_Estado', 'Dependientes_Economicos', 'Tipo_Negocio',
+    'Tamano_Hectareas', 'Tamano_Operacion', 'Frecuencia_Ingresos',
+    'Ingresos_Anuales_Estimados', 'Escolaridad', 'Anos_Experiencia',
+    'Score_Buro_Credito'
+]
+NUMERIC_FEATURES = [
+    'Edad', 'Dependientes_Economicos', 'Tamano_Hectareas',
+    'Ingresos_Anuales_Estimados', 'Anos_Experiencia', 'Score_Buro_Credito'
+]
+CATEGORICAL_MAPS = {
+    'Ubicacion_Estado': MAP_UBICACION,
+    'Tipo_Negocio': MAP_TIPO_NEGOCIO,
+    'Tamano_Operacion': MAP_TAMANO_OPERACION,
+    'Frecuencia_Ingresos': MAP_FRECUENCIA_INGRESOS,
+    'Escolaridad': MAP_ESCOLARIDAD
+}
+
+
+def _safe_float(value):
+    try:
+        result = float(value)
+    except (TypeError, ValueError):
+        return 0.0
+    return 0.0 if result != result else result
+
+
+def _encode_numeric(values):
+    # Igual que pd.to_numeric(errors='coerce').fillna(0): nan pasa a 0 e inf se conserva, como en _safe_float
+    try:
+        column = np.asarray(values, dtype=np.float64)
+        return np.nan_to_num(column, nan=0.0, posinf=np.inf, neginf=-np.inf)
+    except (TypeError, ValueError):
+        return np.array([_safe_float(v) for v in values], dtype=np.float64)
+
+
+def _encode_categorical(values, mapping):
+    # Igual que .map(MAP).fillna(-1), pero buscando cada valor distinto una sola vez
+    keys = np.asarray([str(v) for v in values], dtype=object)
+    unique_keys, inverse = np.unique(keys, return_inverse=True)
+    lookup = np.array([mapping.get(k, -1) for k in unique_keys], dtype=np.float64)
+    return lookup[inverse]
+
+
+def encode_records(records):
+    X = np.empty((len(records), len(SCORING_FEATURES_ORDER)), dtype=np.float64)
+    if not records:
+        return X
+    for j, feature in enumerate(SCORING_FEATURES_ORDER):
+        values = [record.get(feature) for record in records]
+        if feature in CATEGORICAL_MAPS:
+            X[:, j] = _encode_categorical(values, CATEGORICAL_MAPS[feature])
+        else:
+            X[:, j] = _encode_numeric(values)
+    return X
+
+
+def _compile_row_encoder():
+    encoders = []
+    for feature in SCORING_FEATURES_ORDER:
+        if feature in CATEGORICAL_MAPS:
+            mapping = {k: float(v) for k, v in CATEGORICAL_MAPS[feature].items()}
+            encoders.append((feature, lambda value, mapping=mapping: mapping.get(str(value), -1.0)))
+        else:
+            encoders.append((feature, _safe_float))
+    return tuple(encoders)
+
+
+_ROW_ENCODER = _compile_row_encoder()
+
+
+def encode_answers(answers):
+    # Una sola fila para el flujo de WhatsApp, sin construir un DataFrame.
+    # float32 representa exactamente los enteros de las respuestas (edad, ingresos, buro...)
+    return np.array([[encode(answers.get(feature)) for feature, encode in _ROW_ENCODER]], dtype=np.float32)
+
+
+def predict_proba(model, X, native=True):
+    # El booster de LightGBM evita la validacion de sklearn, que domina el costo con pocas filas
+    booster = getattr(model, 'booster_', None) if native else None
+    if booster is None:
+        return model.predict_proba(X)
+    probabilities = booster.predict(X)
+    if probabilities.ndim == 1:
+        probabilities = np.column_stack([1 - probabilities, probabilities])
+    return probabilities
+
+
+def score_answers(model, answers, native=True):
+    probabilities = predict_proba(model, encode_answers(answers), native=native)[0]
+    prediction = int(probabilities.argmax())
+    return MAP_SCORE_NAMES.get(prediction, "Indeterminado"), float(probabilities[prediction]) * 100
+
+
+def score_records(model, records):
+    if not records:
+        return []
+    probabilities = predict_proba(model, encode_records(records))
+    predictions = probabilities.argmax(axis=1)
+    confidences = probabilities.max(axis=1) * 100
+    return [
+        {"score": MAP_SCORE_NAMES.get(int(prediction), "Indeterminado"), "confianza": round(float(confidence), 2)}
+        for prediction, confidence in zip(predictions, confidences)
+    ]
+
+
+def benchmark(model, answers, iterations=2000):
+    import time
+    import warnings
+    import pandas as pd
+
+    # sklearn avisa en cada llamada que la matriz no trae nombres de columnas
+    warnings.simplefilter("ignore", UserWarning)
+
+    def pandas_path():
+        df = pd.DataFrame([answers])
+        for col in NUMERIC_FEATURES:
+            df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
+        for col, mapping in CATEGORICAL_MAPS.items():
+            df[col] = df[col].map(mapping).fillna(-1)
+        return model.predict_proba(df[SCORING_FEATURES_ORDER])
+
+    paths = [
+        ("pandas + predict_proba", pandas_path),
+        ("numpy + predict_proba", lambda: predict_proba(model, encode_answers(answers), native=False)),
+        ("numpy + booster nativo", lambda: predict_proba(model, encode_answers(answers), native=True)),
+    ]
+    for name, path in paths:
+        path()
+        start = time.perf_counter()
+        for _ in range(iterations):
+            path()
+        elapsed = (time.perf_counter() - start) / iterations
+        print(f"{name:>24}: {elapsed * 1e6:8.1f} µs por solicitante")
+
+
+if __name__ == "__main__":
+    import joblib
+
+    example = {
+        'Edad': '35', 'Ubicacion_Estado': 'Jalisco', 'Dependientes_Economicos': '2',
+        'Tipo_Negocio': 'Granos', 'Tamano_Hectareas': '10', 'Tamano_Operacion': 'Mediano',
+        'Frecuencia_Ingresos': 'Estacional', 'Ingresos_Anuales_Estimados': '50000',
+        'Escolaridad': 'Primaria', 'Anos_Experiencia': '12', 'Score_Buro_Credito': -1
+    }
+    benchmark(joblib.load("credit_scoring_model.pkl"), example)
@@ -0,0 +1,164 @@
+import math
+import re
+
+from model.text_utils import normalize_text
+from scoring import (
+    MAP_UBICACION, MAP_TIPO_NEGOCIO, MAP_TAMANO_OPERACION, MAP_FRECUENCIA_INGRESOS,
+    MAP_ESCOLARIDAD
+)
+
+SCORING_QUESTIONS = [
+    {'key': 'Edad', 'question': '1/11: ¿Cuál es tu edad?', 'type': 'numeric'},
+    {'key': 'Ubicacion_Estado', 'question': '2/11: ¿En qué estado vives?',
+     'type': 'categorical', 'options': MAP_UBICACION},
+    {'key': 'Dependientes_Economicos', 'question': '3/11: ¿Cuántas personas dependen económicamente de ti?', 'type': 'numeric'},
+    {'key': 'Tipo_Negocio', 'question': '4/11: ¿Cuál es tu principal actividad?',
+     'type': 'categorical', 'options': MAP_TIPO_NEGOCIO},
+    {'key': 'Tamano_Hectareas', 'question': '5/11: ¿Cuántas hectáreas trabajas?', 'type': 'numeric'},
+    {'key': 'Tamano_Operacion', 'question': '6/11: ¿Consideras tu operación Pequeña, Mediana o Grande?',
+     'type': 'categorical', 'options': MAP_TAMANO_OPERACION},
+    {'key': 'Frecuencia_Ingresos', 'question': '7/11: ¿Tus ingresos son todo el año (Constante) o solo por temporadas (Estacional)?',
+     'type': 'categorical', 'options': MAP_FRECUENCIA_INGRESOS},
+    {'key': 'Ingresos_Anuales_Estimados', 'question': '8/11: ¿Cuál es tu ingreso anual estimado? (Escribe solo el número, ej. 50000)', 'type': 'numeric'},
+    {'key': 'Escolaridad', 'question': '9/11: ¿Cuál es tu último nivel de estudios?',
+     'type': 'categorical', 'options': MAP_ESCOLARIDAD},
+    {'key': 'Anos_Experiencia', 'question': '10/11: ¿Cuántos años de experiencia tienes en el campo?', 'type': 'numeric'},
+    {'key': 'Score_Buro_Credito',
+     'question': "11/11: ¿Sabes tu Score de Buró de Crédito actual? (Escribe el número, o 'No' si no lo sabes)",
+     'type': 'buro_special'}
+]
+
+CANCEL_WORDS = {'cancelar', 'salir', 'menu', 'exit'}
+MULTI_ANSWER_HINT = ("Tip: puedes contestar varias preguntas en un mismo mensaje separando las respuestas "
+                     "con punto y coma, ej. 35; Jalisco; 2")
+
+# Varias respuestas en un mensaje: "35; Jalisco; 2", una por linea o "35, Jalisco, 2".
+# La coma sin espacio no separa, para que "50,000" siga siendo un numero.
+_ANSWER_SEPARATOR_RE = re.compile(r'[;\n]|,\s+')
+_THOUSANDS_RE = re.compile(r'\d{1,3}(,\d{3})+(\.\d+)?')
+_WORD_RE = re.compile(r'\w+')
+# Nombres de opcion con menos letras que esto solo se aceptan completos
+MIN_OPTION_PREFIX = 3
+
+
+class InvalidAnswer(ValueError):
+    pass
+
+
+def parse_number(answer):
+    answer = answer.strip().lstrip('$').strip()
+    if _THOUSANDS_RE.fullmatch(answer):
+        answer = answer.replace(',', '')
+    value = float(answer)
+    if not math.isfinite(value):
+        raise ValueError(answer)
+    return answer
+
+
+def _option_form(text):
+    # Sin acentos, solo palabras y sin la vocal final de genero: "Pequeña" y "Pequeño" -> "pequen"
+    words = _WORD_RE.findall(normalize_text(text))
+    return " ".join(w[:-1] if len(w) > 3 and w[-1] in 'ao' else w for w in words)
+
+
+def _numeric_validator(question):
+    def validate(answer):
+        try:
+            return parse_number(answer)
+        except ValueError:
+            raise InvalidAnswer("Respuesta inválida.")
+    return validate
+
+
+def _buro_validator(question):
+    numeric = _numeric_validator(question)
+
+    def validate(answer):
+        if normalize_text(answer.strip()) == 'no':
+            return -1
+        return numeric(answer)
+    return validate
+
+
+def _categorical_validator(question):
+    options = list(question['options'].keys())
+    forms = [(_option_form(name), name) for name in options]
+    exact = {form: name for form, name in forms}
+
+    def validate(answer):
+        answer = answer.strip()
+        if answer.isdigit():
+            choice_index = int(answer) - 1
+            if 0 <= choice_index < len(options):
+                return options[choice_index]
+            raise InvalidAnswer("Opción no válida.")
+        form = _option_form(answer)
+        if form in exact:
+            return exact[form]
+        # Inicio del nombre o una de sus palabras ("San Luis", "bovinos"), solo si es una sola opcion
+        if len(form) >= MIN_OPTION_PREFIX:
+            matches = [name for option_form, name in forms
+                       if option_form.startswith(form) or f" {form}" in f" {option_form}"]
+            if len(matches) == 1:
+                return matches[0]
+        raise InvalidAnswer("Opción no válida.")
+    return validate
+
+
+def _render_prompt(question):
+    prompt = question['question']
+    if question['type'] == 'categorical':
+        options_list = [f"{i + 1}. {name}" for i, name in enumerate(question['options'].keys())]
+        prompt += "\n\n" + "\n".join(options_list)
+        prompt += "\n\nResponde con el número o el nombre de la opción."
+    return prompt
+
+
+VALIDATORS = {
+    'numeric': _numeric_validator,
+    'categorical': _categorical_validator,
+    'buro_special': _buro_validator
+}
+
+
+class CompiledQuestion:
+
+    def __init__(self, question):
+        self.key = question['key']
+        self.prompt = _render_prompt(question)
+        self.validate = VALIDATORS[question['type']](question)
+
+
+class ScoringFlow:
+    """Preguntas de SCORING_QUESTIONS compiladas una vez: texto ya armado y un validador por pregunta."""
+
+    def __init__(self, questions=SCORING_QUESTIONS):
+        self.questions = [CompiledQuestion(q) for q in questions]
+        self.first_prompt = self.questions[0].prompt + "\n\n" + MULTI_ANSWER_HINT
+
+    def is_cancel(self, message):
+        return normalize_text(message.strip()) in CANCEL_WORDS
+
+    def is_complete(self, step):
+        return step >= len(self.questions)
+
+    def prompt(self, step):
+        return self.questions[step].prompt
+
+    def answer(self, step, answers, message):
+        """Aplica las respuestas del mensaje desde step. Devuelve (nuevo step, mensaje de error o None).
+
+        Se guardan las respuestas validas hasta la primera invalida; lo que sobre tras la ultima pregunta se ignora.
+        """
+        parts = [part for part in _ANSWER_SEPARATOR_RE.split(message) if part.strip()] or [message]
+        for part in parts:
+            if self.is_complete(step):
+                break
+            question = self.questions[step]
+            try:
+                answers[question.key] = question.validate(part)
+            except InvalidAnswer as e:
+                return step, f"{e}\n\n{question.prompt}"
+            step += 1
+        return step, None
+
@@ -0,0 +1,48 @@
+import argparse
+import time
+
+from scoring_flow import SCORING_QUESTIONS, ScoringFlow
+
+
+def legacy_step(question_data, user_answer, answers):
+    # Lo que hacia app.py en cada paso antes de scoring_flow.py, solo para comparar
+    def format_question(question_data):
+        question_text = question_data['question']
+        if question_data['type'] == 'categorical':
+            options_list = [f"{i + 1}. {name}" for i, name in enumerate(question_data['options'].keys())]
+            question_text += "\n\n" + "\n".join(options_list)
+            question_text += "\n\nResponde solo con el número de la opción."
+        return question_text
+
+    if question_data['type'] == 'categorical':
+        answers[question_data['key']] = list(question_data['options'].keys())[int(user_answer) - 1]
+    elif question_data['type'] == 'buro_special' and user_answer.lower() == 'no':
+        answers[question_data['key']] = -1
+    else:
+        float(user_answer)
+        answers[question_data['key']] = user_answer
+    return format_question(question_data)
+
+
+def benchmark(iterations=20000):
+    flow = ScoringFlow()
+    answers = ['35', '5', '2', '4', '10', '1', '2', '50000', '3', '12', 'No']
+    for label, run_step in (
+            ("formatear y validar en cada paso", lambda step, answer: legacy_step(SCORING_QUESTIONS[step], answer, {})),
+            ("preguntas precompiladas", lambda step, answer: (flow.answer(step, {}, answer), flow.prompt(step)))):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            for step, answer in enumerate(answers):
+                run_step(step, answer)
+        elapsed = (time.perf_counter() - start) / (iterations * len(answers))
+        print(f"{label:>32}: {elapsed * 1e6:.2f} us por respuesta")
+    one_message = "; ".join(answers)
+    step, error = flow.answer(0, {}, one_message)
+    print(f"Mensajes para completar el flujo: {len(answers)} contestando una pregunta a la vez, "
+          f"{1 if flow.is_complete(step) and not error else 'error'} con {one_message!r}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mide el flujo de scoring contra la logica anterior")
+    parser.add_argument("--iterations", type=int, default=20000)
+    benchmark(parser.parse_args().iterations)
@@ -0,0 +1,145 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+# Solo se guardan las ultimas lineas del historial; el prompt usa las 4 mas recientes
+MAX_HISTORY = 20
+
+
+def _dumps(session):
+    if len(session.get("history", ())) > MAX_HISTORY:
+        session = dict(session, history=session["history"][-MAX_HISTORY:])
+    return json.dumps(session, ensure_ascii=False, separators=(',', ':'))
+
+
+class SessionStore(ABC):
+    """Interfaz tipo dict. Las sesiones se devuelven como copias: tras modificarlas hay que volver a asignarlas."""
+
+    @abstractmethod
+    def get(self, user_id, default=None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def __setitem__(self, user_id, session):
+        raise NotImplementedError
+
+    @abstractmethod
+    def __delitem__(self, user_id):
+        raise NotImplementedError
+
+    def __getitem__(self, user_id):
+        session = self.get(user_id)
+        if session is None:
+            raise KeyError(user_id)
+        return session
+
+    def __contains__(self, user_id):
+        return self.get(user_id) is not None
+
+
+class InMemorySessionStore(SessionStore):
+
+    def __init__(self, ttl_seconds=24 * 3600, max_sessions=50000):
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self.sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id, default=None):
+        with self._lock:
+            entry = self.sessions.get(user_id)
+            if entry is None:
+                return default
+            data, expires_at = entry
+            if expires_at < time.time():
+                del self.sessions[user_id]
+                return default
+            return json.loads(data)
+
+    def __setitem__(self, user_id, session):
+        data = _dumps(session)
+        with self._lock:
+            self.sessions.pop(user_id, None)
+            self.sessions[user_id] = (data, time.time() + self.ttl_seconds)
+            while len(self.sessions) > self.max_sessions:
+                self.sessions.popitem(last=False)
+
+    def __delitem__(self, user_id):
+        with self._lock:
+            self.sessions.pop(user_id, None)
+
+    def __len__(self):
+        return len(self.sessions)
+
+
+class SQLiteSessionStore(SessionStore):
+
+    PURGE_EVERY = 500
+
+    def __init__(self, db_path="sessions.db", ttl_seconds=24 * 3600):
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self._local = threading.local()
+        self._writes = 0
+        conn = self._connection()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "user_id TEXT PRIMARY KEY, data TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions (expires_at)")
+        conn.commit()
+
+    def _connection(self):
+        # Una conexion por hilo; WAL permite lectores concurrentes de varios procesos
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, user_id, default=None):
+        row = self._connection().execute(
+            "SELECT data FROM sessions WHERE user_id = ? AND expires_at > ?", (user_id, time.time())
+        ).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def __setitem__(self, user_id, session):
+        conn = self._connection()
+        now = time.time()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO sessions (user_id, data, expires_at) VALUES (?, ?, ?)",
+                (user_id, _dumps(session), now + self.ttl_seconds)
+            )
+        self._writes += 1
+        if self._writes % self.PURGE_EVERY == 0:
+            self.purge_expired(now)
+
+    def __delitem__(self, user_id):
+        conn = self._connection()
+        with conn:
+            conn.execute("DELETE FROM sessions WHERE user_id = ?", (user_id,))
+
+    def purge_expired(self, now=None):
+        conn = self._connection()
+        with conn:
+            conn.execute("DELETE FROM sessions WHERE expires_at <= ?", (now or time.time(),))
+
+    def __len__(self):
+        return self._connection().execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+
+def create_session_store():
+    backend = os.environ.get("SESSION_BACKEND", "memory")
+    ttl_seconds = int(os.environ.get("SESSION_TTL_SECONDS", 24 * 3600))
+    if backend == "sqlite":
+        return SQLiteSessionStore(os.environ.get("SESSION_DB", "sessions.db"), ttl_seconds=ttl_seconds)
+    if backend == "memory":
+        return InMemorySessionStore(ttl_seconds=ttl_seconds)
+    raise ValueError(f"SESSION_BACKEND desconocido: {backend}")
@@ -0,0 +1,82 @@
+import multiprocessing
+import threading
+import time
+
+import pytest
+
+from idempotency import IdempotencyIndex, SQLiteIdempotencyIndex
+
+
+def _run_in_other_process(db_path, key, queue):
+    index = SQLiteIdempotencyIndex(db_path)
+    queue.put(index.run(key, lambda: "segunda ejecucion", wait_timeout=5))
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def index(request, tmp_path):
+    if request.param == "memory":
+        return IdempotencyIndex()
+    return SQLiteIdempotencyIndex(str(tmp_path / "sessions.db"))
+
+
+def test_retry_returns_stored_response(index):
+    calls = []
+    assert index.run("SM1", lambda: calls.append(1) or "hola") == ("hola", False)
+    assert index.run("SM1", lambda: calls.append(1) or "otra") == ("hola", True)
+    assert len(calls) == 1
+
+
+def test_none_response_is_remembered(index):
+    assert index.run("SM1", lambda: None) == (None, False)
+    assert index.run("SM1", lambda: "otra") == (None, True)
+
+
+def test_failed_handler_lets_retry_run_again(index):
+    def fail():
+        raise ValueError("boom")
+    with pytest.raises(ValueError):
+        index.run("SM1", fail)
+    assert index.run("SM1", lambda: "ok") == ("ok", False)
+
+
+def test_retry_waits_for_original(index):
+    started = threading.Event()
+
+    def slow():
+        started.set()
+        time.sleep(0.3)
+        return "lento"
+    thread = threading.Thread(target=index.run, args=("SM1", slow))
+    thread.start()
+    started.wait()
+    assert index.run("SM1", lambda: "otra", wait_timeout=5) == ("lento", True)
+    thread.join()
+
+
+def test_retry_times_out_while_original_runs(index):
+    release = threading.Event()
+    thread = threading.Thread(target=index.run, args=("SM1", release.wait))
+    thread.start()
+    time.sleep(0.05)
+    with pytest.raises(TimeoutError):
+        index.run("SM1", lambda: "otra", wait_timeout=0.1)
+    release.set()
+    thread.join()
+
+
+def test_sqlite_index_is_shared_between_processes(tmp_path):
+    db_path = str(tmp_path / "sessions.db")
+    SQLiteIdempotencyIndex(db_path).run("SM1", lambda: "primera ejecucion")
+    queue = multiprocessing.get_context("spawn").Queue()
+    process = multiprocessing.get_context("spawn").Process(target=_run_in_other_process, args=(db_path, "SM1", queue))
+    process.start()
+    assert queue.get(timeout=30) == ("primera ejecucion", True)
+    process.join()
+
+
+def test_sqlite_pending_entry_expires(tmp_path):
+    # Si el proceso que tomo el mensaje muere, otro reintento lo procesa al vencer la reserva
+    index = SQLiteIdempotencyIndex(str(tmp_path / "sessions.db"), pending_seconds=0.1)
+    assert index._begin("SM1")
+    time.sleep(0.15)
+    assert index.run("SM1", lambda: "reintento") == ("reintento", False)
@@ -0,0 +1,72 @@
+import pytest
+
+from router import INTENT_KEYWORDS, MessageRouter
+
+# (mensaje, modo de la sesion, intencion esperada)
+ROUTING_CASES = [
+    ("", None, "greeting"),
+    ("   ", None, "greeting"),
+    ("hola", None, "greeting"),
+    ("Hola", None, "greeting"),
+    ("hi", None, "greeting"),
+    ("inicio", None, "greeting"),
+    ("start", None, "greeting"),
+    ("menu", None, "greeting"),
+    ("Menú", None, "greeting"),
+    ("hola, quiero aprender", None, "educational"),
+    ("1", None, "educational"),
+    ("educación", None, "educational"),
+    ("educacion financiera", None, "educational"),
+    ("quiero aprender", None, "educational"),
+    ("háblame del ahorro", None, "educational"),
+    ("hablame del ahorro", None, "educational"),
+    ("habrame de prestamos", None, "educational"),
+    ("enséñame a ahorrar", None, "educational"),
+    ("enseñame a ahorrar", None, "educational"),
+    ("ensename a ahorrar", None, "educational"),
+    ("dime qué es un interés", None, "educational"),
+    ("INFO", None, "educational"),
+    ("2", None, "transfer"),
+    ("transferencia", None, "transfer"),
+    ("Transferéncia", None, "transfer"),
+    ("quiero hacer un pago", None, "transfer"),
+    ("3", None, "scoring"),
+    ("crédito", None, "scoring"),
+    ("credito", None, "scoring"),
+    ("CRÉDITO", None, "scoring"),
+    ("calcular", None, "scoring"),
+    ("mi perfil", None, "scoring"),
+    # Prioridad: educacion antes que transferencia antes que scoring
+    ("dime cómo pedir un crédito", None, "educational"),
+    ("info de transferencia", None, "educational"),
+    ("pago de mi crédito", None, "transfer"),
+    ("12", None, "educational"),
+    ("23", None, "transfer"),
+    ("¿qué siembro en otoño?", None, "educational"),
+    # Dentro de un flujo el mensaje siempre es respuesta del flujo
+    ("hola", "scoring", "scoring_flow"),
+    ("2", "scoring", "scoring_flow"),
+    ("1", "transfer", "transfer_flow"),
+    ("sí", "transfer", "transfer_flow"),
+    ("dime algo", "educational", "educational"),
+    ("2", "educational", "transfer"),
+]
+
+KEYWORD_CASES = [(name, keyword) for name, keywords in INTENT_KEYWORDS for keyword in keywords]
+
+
+@pytest.fixture(scope="module")
+def router():
+    return MessageRouter()
+
+
+@pytest.mark.parametrize("message, mode, expected", ROUTING_CASES)
+def test_route(router, message, mode, expected):
+    assert router.route(message, mode) == expected
+
+
+@pytest.mark.parametrize("name, keyword", KEYWORD_CASES)
+def test_keyword_routes_to_its_intent(router, name, keyword):
+    # Cada palabra clave, sola y dentro de una frase, debe llevar a su intencion
+    assert router.route(keyword) == name
+    assert router.route(f"algo sobre {keyword.upper()} por favor") == name
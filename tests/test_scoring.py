@@ -0,0 +1,20 @@
+import math
+
+import numpy as np
+
+from scoring import SCORING_FEATURES_ORDER, encode_answers, encode_records
+
+
+def test_encode_records_matches_encode_answers_for_non_finite_values():
+    column = SCORING_FEATURES_ORDER.index('Ingresos_Anuales_Estimados')
+    for value, expected in [(float('nan'), 0.0), ('nan', 0.0), (float('inf'), math.inf),
+                            ('-inf', -math.inf), ('abc', 0.0), (None, 0.0)]:
+        record = {'Ingresos_Anuales_Estimados': value}
+        assert encode_records([record])[0, column] == expected
+        assert encode_answers(record)[0, column] == expected
+
+
+def test_encode_records_mixed_column_uses_same_rules():
+    records = [{'Edad': v} for v in (35, '40', 'x', float('nan'), float('-inf'))]
+    column = SCORING_FEATURES_ORDER.index('Edad')
+    np.testing.assert_array_equal(encode_records(records)[:, column], [35.0, 40.0, 0.0, 0.0, -np.inf])
@@ -0,0 +1,95 @@
+import pytest
+
+from scoring_flow import SCORING_QUESTIONS, InvalidAnswer, ScoringFlow
+
+# (pregunta, respuesta, valor esperado o None si debe rechazarse)
+ANSWER_CASES = [
+    ('Edad', '35', '35'),
+    ('Edad', ' 42 ', '42'),
+    ('Edad', 'treinta', None),
+    ('Edad', 'nan', None),
+    ('Ingresos_Anuales_Estimados', '50000', '50000'),
+    ('Ingresos_Anuales_Estimados', '50,000', '50000'),
+    ('Ingresos_Anuales_Estimados', '$1,250,000.50', '1250000.50'),
+    ('Ingresos_Anuales_Estimados', '5,00', None),
+    ('Ubicacion_Estado', '5', 'Jalisco'),
+    ('Ubicacion_Estado', '0', None),
+    ('Ubicacion_Estado', '19', None),
+    ('Ubicacion_Estado', 'jalisco', 'Jalisco'),
+    ('Ubicacion_Estado', 'Michoacán', 'Michoacan'),
+    ('Ubicacion_Estado', 'nuevo leon', 'Nuevo León'),
+    ('Ubicacion_Estado', 'San Luis', 'San Luis Potosí'),
+    ('Ubicacion_Estado', 'CDMX', None),
+    ('Tipo_Negocio', 'granos', 'Granos'),
+    ('Tipo_Negocio', 'bovinos', 'Ganaderia - Bovinos'),
+    ('Tipo_Negocio', 'Ganadería - Porcinos', 'Ganaderia - Porcinos'),
+    ('Tipo_Negocio', 'ganaderia', None),
+    ('Tamano_Operacion', 'Pequeña', 'Pequeño'),
+    ('Tamano_Operacion', 'mediana', 'Mediano'),
+    ('Tamano_Operacion', '3', 'Grande'),
+    ('Frecuencia_Ingresos', 'estacional', 'Estacional'),
+    ('Escolaridad', 'sin estudios', 'Sin estudios'),
+    ('Escolaridad', 'prepa', 'Preparatoria'),
+    ('Score_Buro_Credito', 'No', -1),
+    ('Score_Buro_Credito', 'no', -1),
+    ('Score_Buro_Credito', '650', '650'),
+    ('Score_Buro_Credito', 'quizas', None),
+]
+
+# (step inicial, mensaje, step esperado, se espera error)
+MESSAGE_CASES = [
+    (0, '35', 1, False),
+    (0, '35; Jalisco; 2', 3, False),
+    (0, '35, 5, 2, granos', 4, False),
+    (0, '35\nJalisco\n2', 3, False),
+    (0, '35; Marte; 2', 1, True),
+    (7, '50,000', 8, False),
+    (7, '50,000, universidad', 9, False),
+    (10, 'No', 11, False),
+    (10, 'No, no lo sé', 11, False),
+    (0, '35; 5; 2; granos; 10; pequeña; constante; 50,000; primaria; 12; no', 11, False),
+]
+
+OPTION_CASES = [
+    (question['key'], answer, name)
+    for question in SCORING_QUESTIONS
+    for i, name in enumerate(question.get('options', {}))
+    for answer in (str(i + 1), name, name.upper())
+]
+
+
+@pytest.fixture(scope="module")
+def flow():
+    return ScoringFlow()
+
+
+def _validate(flow, key, answer):
+    question = next(q for q in flow.questions if q.key == key)
+    try:
+        return question.validate(answer)
+    except InvalidAnswer:
+        return None
+
+
+@pytest.mark.parametrize("key, answer, expected", ANSWER_CASES)
+def test_validate_answer(flow, key, answer, expected):
+    assert _validate(flow, key, answer) == expected
+
+
+@pytest.mark.parametrize("key, answer, expected", OPTION_CASES)
+def test_every_option_accepted_by_number_and_name(flow, key, answer, expected):
+    assert _validate(flow, key, answer) == expected
+
+
+@pytest.mark.parametrize("step, message, expected_step, expect_error", MESSAGE_CASES)
+def test_answer_message(flow, step, message, expected_step, expect_error):
+    got_step, error = flow.answer(step, {}, message)
+    assert got_step == expected_step
+    assert (error is not None) == expect_error
+
+
+def test_whole_flow_in_one_message(flow):
+    answers = {}
+    step, error = flow.answer(0, answers, '35; 5; 2; granos; 10; pequeña; constante; 50,000; primaria; 12; no')
+    assert flow.is_complete(step) and error is None
+    assert answers['Tipo_Negocio'] == 'Granos' and answers['Score_Buro_Credito'] == -1
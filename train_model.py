@@ -1,50 +1,153 @@
+import argparse
+import json
 import os
 import sys
 
-def main():
+from model.file_utils import inputs_digest
+
+BASE_MODEL = "microsoft/DialoGPT-medium"
+PDF_DIRECTORY = "data/knowledge_base/"
+DATASET_FILE = "data/training/financial_education_dataset.jsonl"
+KNOWLEDGE_INDEX_FILE = "data/knowledge_index.json"
+TRAINING_FILE = "data/training/training_conversations.txt"
+TOKENS_PREFIX = os.path.splitext(TRAINING_FILE)[0] + ".tokens"
+STATE_FILE = "data/training/pipeline_state.json"
+
+
+def load_state():
+    try:
+        with open(STATE_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def save_state(state):
+    os.makedirs(os.path.dirname(STATE_FILE), exist_ok=True)
+    with open(STATE_FILE + ".tmp", 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=2)
+    os.replace(STATE_FILE + ".tmp", STATE_FILE)
+
+
+def pdf_files():
+    if not os.path.isdir(PDF_DIRECTORY):
+        return []
+    return [os.path.join(PDF_DIRECTORY, f) for f in os.listdir(PDF_DIRECTORY) if f.lower().endswith('.pdf')]
+
+
+def run_process_pdfs():
+    from model.pdf_processer import process_pdfs
+    return bool(process_pdfs())
+
+
+def run_prepare_training_data():
+    from model.training_preparer import prepare_training_data
+    return prepare_training_data() is not None
+
+
+def run_tokenize():
+    # Solo hace falta el tokenizer; el modelo se carga hasta el fine-tuning
+    from transformers import AutoTokenizer
+    from model.token_dataset import build_token_dataset
+    build_token_dataset(TRAINING_FILE, AutoTokenizer.from_pretrained(BASE_MODEL), TOKENS_PREFIX)
+    return True
+
+
+def run_fine_tune(output_dir, use_lora, resume):
+    from transformers.trainer_utils import get_last_checkpoint
+    from model.chatbot_model import FinancialChatbot
+
+    checkpoint = get_last_checkpoint(output_dir) if resume and os.path.isdir(output_dir) else None
+    if checkpoint:
+        print(f"Reanudando desde: {checkpoint}")
+    elif resume:
+        print("No hay checkpoints previos, se entrena desde el inicio")
+
+    print("Cargando modelo base...")
+    chatbot = FinancialChatbot(BASE_MODEL)
+    return chatbot.fine_tune(
+        train_file=TRAINING_FILE,
+        output_dir=output_dir,
+        use_lora=use_lora,
+        resume_from_checkpoint=checkpoint
+    )
+
+
+def pipeline_stages(output_dir, use_lora, resume):
+    # Cada etapa declara sus entradas (datos y el codigo que las transforma) y sus artefactos.
+    # Si la huella de las entradas no cambio y los artefactos existen, la etapa se omite.
+    return [
+        {
+            "name": "pdfs",
+            "description": "Procesando PDFs",
+            "inputs": pdf_files() + ["model/pdf_processer.py", "model/dedup.py", "model/knowledge_index.py",
+                                     "model/text_utils.py", "model/jsonl_dataset.py"],
+            "outputs": [DATASET_FILE, KNOWLEDGE_INDEX_FILE],
+            "run": run_process_pdfs,
+        },
+        {
+            "name": "conversaciones",
+            "description": "Preparando datos de entrenamiento",
+            "inputs": [DATASET_FILE, "model/training_preparer.py", "model/jsonl_dataset.py"],
+            "outputs": [TRAINING_FILE],
+            "run": run_prepare_training_data,
+        },
+        {
+            "name": "tokens",
+            "description": "Tokenizando conversaciones",
+            "inputs": [TRAINING_FILE, "model/token_dataset.py"],
+            "params": {"tokenizer": BASE_MODEL},
+            "outputs": [TOKENS_PREFIX + ".bin", TOKENS_PREFIX + ".idx", TOKENS_PREFIX + ".turns", TOKENS_PREFIX + ".json"],
+            "run": run_tokenize,
+        },
+        {
+            "name": "fine_tune",
+            "description": "Fine-tuning LoRA" if use_lora else "Fine-tuning",
+            # Hiperparametros y LoRA (chatbot_model), bloques (token_dataset) y collator (training_metrics)
+            "inputs": [TRAINING_FILE, "model/chatbot_model.py", "model/token_dataset.py", "model/training_metrics.py"],
+            "params": {"model": BASE_MODEL, "lora": use_lora, "output_dir": output_dir},
+            "outputs": [os.path.join(output_dir, "adapter_config.json" if use_lora else "config.json")],
+            "run": lambda: run_fine_tune(output_dir, use_lora, resume),
+        },
+    ]
+
+
+def main(use_lora=False, resume=False, force=False):
     print("=== Iniciando entrenamiento ===")
-    
+    output_dir = "./lora-financial-chatbot" if use_lora else "./fine-tuned-financial-chatbot"
+
     try:
-        
-        print("\n1. Procesando PDFs ...")
-        from model.pdf_processer import process_pdfs
-        training_data = process_pdfs()
-        if not training_data:
-            print("No se pudieron procesar los PDFs")
-            return False
-
-
-        print("\n2. Preparando datos de entrenamiento...")
-        from model.training_preparer import prepare_training_data
-        training_file = prepare_training_data()
-        if not training_file:
-            print("No se pudieron preparar los datos")
-            return False
-        
-
-        print("\n3. Cargando modelo base...")
-        from model.chatbot_model import FinancialChatbot
-        chatbot = FinancialChatbot()
-        
-
-        print("\n4. Iniciando fine-tuning ...")
-        success = chatbot.fine_tune(
-            train_file=training_file,
-            output_dir="./fine-tuned-financial-chatbot" 
-        )
-        
-        if success:
-            print("\n¡Entrenamiento completado")
-            print("Modelo guardado en: ./fine-tuned-financial-chatbot")
-            return True
-        else:
-            print("\nError durante el entrenamiento")
-            return False
-            
+        state = load_state()
+        for number, stage in enumerate(pipeline_stages(output_dir, use_lora, resume), 1):
+            digest = inputs_digest(stage["inputs"], stage.get("params"))
+            outputs_ready = all(os.path.exists(path) for path in stage["outputs"])
+            if not force and state.get(stage["name"]) == digest and outputs_ready:
+                print(f"\n{number}. {stage['description']}: sin cambios, se omite")
+                continue
+
+            print(f"\n{number}. {stage['description']}...")
+            if not stage["run"]():
+                print(f"\nError en la etapa: {stage['description']}")
+                return False
+            state[stage["name"]] = digest
+            save_state(state)
+
+        print("\n¡Entrenamiento completado")
+        print(f"Modelo guardado en: {output_dir}")
+        return True
+
     except Exception as e:
         print(f"\nError general: {e}")
         return False
 
 if __name__ == "__main__":
-    success = main()
-    sys.exit(0 if success else 1)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Procesa los PDFs y entrena el chatbot financiero")
+    parser.add_argument("--lora", action="store_true",
+                        help="Entrena solo un adaptador LoRA (se guarda en ./lora-financial-chatbot)")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continua el fine-tuning desde el ultimo checkpoint de la carpeta de salida")
+    parser.add_argument("--force", action="store_true",
+                        help="Ejecuta todas las etapas aunque sus entradas no hayan cambiado")
+    args = parser.parse_args()
+    success = main(use_lora=args.lora, resume=args.resume, force=args.force)
+    sys.exit(0 if success else 1)
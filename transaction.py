@@ -1,27 +1,27 @@
+import math
+
 from flask import Flask, request, session
 from twilio.twiml.messaging_response import MessagingResponse
+from ledger import InsufficientFundsError, LedgerError, create_ledger, to_cents
 #import os
 
 app = Flask(__name__)
 #app.secret_key = os.environ.get('SECRET_KEY', 'tu-clave-secreta-cambiar-en-produccion')
 
 
-ACCOUNTS = {
-    "ACC001": {"holder": "Sergio Rock", "balance": 1000.00},
-    "ACC002": {"holder": "Emilio Pinelo", "balance": 500.00}
-}
+# Mismo ledger (LEDGER_DB) que usa app.py
+ledger = create_ledger()
 
 
 def process_transfer(from_acc, to_acc, amount):
     """Ejecuta la transferencia"""
-    ACCOUNTS[from_acc]["balance"] -= amount
-    ACCOUNTS[to_acc]["balance"] += amount
+    transfer = ledger.transfer(from_acc, to_acc, amount)
     
     result = "Transferencia Exitosa\n\n"
-    result += f"Se transfirieron ${amount:.2f} de {ACCOUNTS[from_acc]['holder']} a {ACCOUNTS[to_acc]['holder']}\n\n"
+    result += f"Se transfirieron ${amount:.2f} de {ledger.get_account(from_acc)['holder']} a {ledger.get_account(to_acc)['holder']}\n\n"
     result += "Saldos Actualizados:\n"
-    result += f"• {from_acc}: ${ACCOUNTS[from_acc]['balance']:.2f}\n"
-    result += f"• {to_acc}: ${ACCOUNTS[to_acc]['balance']:.2f}\n"
+    result += f"• {from_acc}: ${transfer['balances'][from_acc]:.2f}\n"
+    result += f"• {to_acc}: ${transfer['balances'][to_acc]:.2f}\n"
     return result
 
 
@@ -51,7 +51,7 @@ def webhook():
     elif state == 'WAITING_FOR_SOURCE':
         account_number = incoming_msg.upper()
         
-        if account_number not in ACCOUNTS:
+        if account_number not in ledger:
             msg.body(f"Cuenta {account_number} no encontrada. Por favor, ingresa un número de cuenta válido:")
         else:
             session['from_account'] = account_number
@@ -63,7 +63,7 @@ def webhook():
     elif state == 'WAITING_FOR_DESTINATION':
         account_number = incoming_msg.upper()
         
-        if account_number not in ACCOUNTS:
+        if account_number not in ledger:
             msg.body(f"Cuenta {account_number} no encontrada. Por favor, ingresa un número de cuenta válido:")
         elif account_number == session['from_account']:
             msg.body("No puedes transferir a la misma cuenta. Por favor, ingresa un número de cuenta diferente:")
@@ -71,18 +71,20 @@ def webhook():
             session['to_account'] = account_number
             session['state'] = 'WAITING_FOR_AMOUNT'
             
-            from_balance = ACCOUNTS[session['from_account']]['balance']
+            from_balance = ledger.get_account(session['from_account'])['balance']
             response_text = f"¿Qué monto deseas transferir?\n(Saldo disponible: ${from_balance:.2f})"
             msg.body(response_text)
     
     elif state == 'WAITING_FOR_AMOUNT':
         try:
             amount = float(incoming_msg.replace("$", "").strip())
+            if not math.isfinite(amount):
+                raise ValueError(incoming_msg)
+            available = ledger.get_account(session['from_account'])['balance']
             
-            if amount <= 0:
+            if to_cents(amount) <= 0:
                 msg.body("El monto debe ser mayor a cero. Por favor, ingresa un monto válido:")
-            elif amount > ACCOUNTS[session['from_account']]['balance']:
-                available = ACCOUNTS[session['from_account']]['balance']
+            elif amount > available:
                 msg.body(f"Fondos insuficientes. Saldo disponible: ${available:.2f}\nPor favor, ingresa un monto válido:")
             else:
                 session['amount'] = amount
@@ -92,8 +94,8 @@ def webhook():
                 to_acc = session['to_account']
                 
                 summary = "\nResumen de la Transferencia\n"
-                summary += f"Desde: {ACCOUNTS[from_acc]['holder']} ({from_acc})\n"
-                summary += f"Para: {ACCOUNTS[to_acc]['holder']} ({to_acc})\n"
+                summary += f"Desde: {ledger.get_account(from_acc)['holder']} ({from_acc})\n"
+                summary += f"Para: {ledger.get_account(to_acc)['holder']} ({to_acc})\n"
                 summary += f"Monto: ${amount:.2f}\n"
                 summary += "━━━━━━━━━━━━━━━━━━━━━\n\n"
                 summary += "Por favor, confirma esta transferencia.\nResponde SÍ para confirmar o NO para cancelar."
@@ -111,7 +113,13 @@ def webhook():
             to_acc = session['to_account']
             amount = session['amount']
             
-            result = process_transfer(from_acc, to_acc, amount)
+            try:
+                result = process_transfer(from_acc, to_acc, amount)
+            except InsufficientFundsError as e:
+                result = f"Fondos insuficientes. Saldo disponible: ${e.available:.2f}\nTransferencia cancelada.\n"
+            except (LedgerError, ValueError) as e:
+                print(f"❌ Transferencia rechazada por el ledger: {e}")
+                result = "No se pudo completar la transferencia. Transferencia cancelada.\n"
             result += "\nResponde 'INICIAR' para hacer otra transferencia."
             
             msg.body(result)